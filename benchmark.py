@@ -0,0 +1,457 @@
+# 离线性能基准：用合成的 community 仓库、本地 HTTP 服务和 SMTP 接收端代替所有上游服务，统计每个阶段的耗时并与基线比较
+import argparse
+import json
+import os
+import random
+import shutil
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+repo_dir = os.path.dirname(os.path.abspath(__file__))
+stages = ['startup', 'prepare_env', 'get_sigs', 'all_sigs_compare', 'get_repos_pulls_mapping', 'pr_statistics',
+          'render', 'send', 'workbook', 'get_open_pulls', 'members_pr_statistics', 'members_render', 'members_send']
+review_key = '以下为 openEuler-Advisor 的 review_tool 生成审视要求清单'
+# libraries which must not be loaded by importing the entry points
+heavy_modules = ['openpyxl', 'pandas', 'numpy', 'xlsx2html']
+
+
+def parse_args():
+    """
+    Parse options of the benchmark
+    :return: argparse.Namespace
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sigs', type=int, default=50, help='number of sigs')
+    parser.add_argument('--repos', type=int, default=20, help='number of repositories of every sig')
+    parser.add_argument('--prs', type=int, default=5000, help='number of open Pull Requests of all repositories')
+    parser.add_argument('--receivers', type=int, default=300, help='number of maintainers and committers')
+    parser.add_argument('--community-prs', type=int, default=100,
+                        help='number of open Pull Requests of openeuler/community for members_change_attention')
+    parser.add_argument('--workers', type=lambda x: [int(y) for y in x.split(',')], default=[1],
+                        help='number of processes to render reports, a comma separated list like 1,2,4,8 runs the '
+                             'benchmark with every number and compares how the rendering scales')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of every stage, the fastest one is kept')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the synthetic data')
+    parser.add_argument('--baseline', default=os.path.join(repo_dir, 'benchmark_baseline.json'),
+                        help='file of the stored baseline timings')
+    parser.add_argument('--save-baseline', action='store_true', help='store the timings of this run as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='relative slowdown against the baseline reported as a regression')
+    parser.add_argument('--profile', metavar='DIR',
+                        help='profile every stage with cProfile and tracemalloc and write the reports into DIR, '
+                             'timings are not checked against the baseline')
+    parser.add_argument('--memory', action='store_true',
+                        help='compare the peak memory of collecting the rows from the fetched pulls list and from '
+                             'the streamed pages')
+    return parser.parse_args()
+
+
+class Fixtures(object):
+    def __init__(self, args):
+        """
+        Generate the synthetic sigs, Pull Requests and comments
+        :param args: options of the benchmark
+        """
+        rng = random.Random(args.seed)
+        self.receivers = ['user{:04d}'.format(i) for i in range(args.receivers)]
+        self.sigs = {}
+        for i in range(args.sigs):
+            repos = ['src-openeuler/pkg{:03d}-{:03d}'.format(i, j) for j in range(args.repos)]
+            self.sigs['sig-{:03d}'.format(i)] = {
+                'maintainers': rng.sample(self.receivers, min(3, len(self.receivers))),
+                'repos': repos,
+                'committers': {repo: rng.sample(self.receivers, min(2, len(self.receivers)))
+                               for repo in rng.sample(repos, len(repos) // 4)}
+            }
+        all_repos = [repo for sig in self.sigs.values() for repo in sig['repos']]
+        members = sorted({x for sig in self.sigs.values() for x in sig['maintainers']})
+        labels = ['openeuler-cla/yes', 'openeuler-cla/yes,ci_failed', 'openeuler-cla/no', 'kind/wait_for_update']
+        self.pulls = []
+        for i in range(args.prs):
+            created_at = time.time() - rng.randrange(3600 * 24 * 800)
+            self.pulls.append({
+                'link': 'https://gitee.com/{}/pulls/{}'.format(rng.choice(all_repos), i + 1),
+                'title': 'Update to version 1.{} <fix>'.format(i),
+                'created_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(created_at)),
+                'draft': rng.random() < 0.05,
+                'labels': rng.choice(labels),
+                'ref': rng.choice(['master', 'openEuler-22.03-LTS-SP1', 'openEuler-24.03-LTS']),
+                'mergeable': rng.random() > 0.1
+            })
+        self.community_pulls = []
+        self.comments = {}
+        for number in range(1, args.community_prs + 1):
+            comments = [{'user': {'login': 'reviewer'}, 'body': '/lgtm'} for _ in range(rng.choice([2, 30, 150]))]
+            reviewers = ' '.join('@' + x for x in rng.sample(members, min(4, len(members))))
+            checklist = '{}\n|a|b|c|d|e|\n|1|x|y|{}|[&#x1F534;]|'.format(review_key, reviewers)
+            comments.insert(rng.randrange(len(comments) + 1), {'user': {'login': 'openeuler-ci-bot'},
+                                                                'body': checklist})
+            self.comments[number] = comments
+            self.community_pulls.append({
+                'number': number,
+                'html_url': 'https://gitee.com/openeuler/community/pulls/{}'.format(number),
+                'title': 'Change members of sig-{:03d}'.format(number % max(args.sigs, 1)),
+                'mergeable': True,
+                'draft': False,
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S+08:00', time.localtime(time.time() - number * 3600)),
+                'updated_at': '2024-01-01T00:00:00+08:00',
+                'comments': len(comments),
+                'labels': [{'name': 'openeuler-cla/yes'}],
+                'head': {'ref': 'master'}
+            })
+
+    def write_community(self, path):
+        """
+        Write the sig directory as a git repository which can be cloned like the real community repository
+        :param path: path of the repository
+        """
+        for sig, info in self.sigs.items():
+            sig_dir = os.path.join(path, 'sig', sig)
+            for repo in info['repos']:
+                org, name = repo.split('/')
+                os.makedirs(os.path.join(sig_dir, org, name[0]), exist_ok=True)
+                with open(os.path.join(sig_dir, org, name[0], name + '.yaml'), 'w') as f:
+                    f.write('name: {}\n'.format(name))
+            with open(os.path.join(sig_dir, 'sig-info.yaml'), 'w') as f:
+                json.dump({
+                    'name': sig,
+                    'maintainers': [{'gitee_id': x, 'email': '{}@example.com'.format(x)} for x in info['maintainers']],
+                    'repositories': [{'repo': [repo], 'committers': [
+                        {'gitee_id': x, 'email': '{}@example.com'.format(x)} for x in committers]}
+                        for repo, committers in info['committers'].items()]
+                }, f)
+        commands = [
+            ['git', 'init', '-q', path],
+            ['git', '-C', path, 'config', 'uploadpack.allowFilter', 'true'],
+            ['git', '-C', path, 'add', '-A'],
+            ['git', '-C', path, '-c', 'user.name=benchmark', '-c', 'user.email=benchmark@example.com',
+             'commit', '-q', '-m', 'synthetic community']
+        ]
+        for command in commands:
+            subprocess.check_call(command)
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    fixtures = None
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, body, total=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        if total is not None:
+            self.send_header('total_count', str(total))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        """
+        Serve /ipb/pulls, /dsapi/query/sig/pr/state and the Gitee pulls and comments of openeuler/community
+        """
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        page, per_page = int(query.get('page', 1)), int(query.get('per_page', 20))
+        parts = url.path.strip('/').split('/')
+        if parts[0] == 'ipb':
+            pulls = self.fixtures.pulls
+            self.send_json({'data': pulls[(page - 1) * per_page:page * per_page], 'total': len(pulls)})
+        elif parts[0] == 'dsapi':
+            seed = sum(map(ord, query['sig'])) + int(query['timestamp']) // 86400000
+            self.send_json({'data': {'merged': seed % 97, 'closed': seed % 13, 'open': seed % 31}})
+        elif parts[-1] == 'comments':
+            comments = self.fixtures.comments[int(parts[-2])]
+            self.send_json(comments[(page - 1) * per_page:page * per_page], len(comments))
+        else:
+            pulls = self.fixtures.community_pulls
+            self.send_json(pulls[(page - 1) * per_page:page * per_page], len(pulls))
+
+
+class SmtpSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        """
+        Accept every message over plain SMTP and count them
+        """
+        super().__init__(('127.0.0.1', 0), SmtpHandler)
+        self.messages = 0
+        self.lock = threading.Lock()
+
+
+class SmtpHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write((line + '\r\n').encode())
+
+    def handle(self):
+        self.reply('220 benchmark sink')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip().upper()
+            if command == 'DATA':
+                self.reply('354 end with .')
+                while self.rfile.readline() not in [b'.\r\n', b'']:
+                    pass
+                with self.server.lock:
+                    self.server.messages += 1
+                self.reply('250 queued')
+            elif command == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 ok')
+
+
+def start_server(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def timed(timings, stage, func):
+    """
+    Wrap a function to add its time to a stage, used for the stages run inside pr_statistics
+    """
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            with lock:
+                timings[stage] = timings.get(stage, 0) + elapsed
+
+    lock = threading.Lock()
+    return wrapper
+
+
+def run_stages(args, sink, workers):
+    """
+    Run every stage of both jobs once
+    :param workers: number of processes to render reports
+    :return: a dict of {stage: seconds}
+    """
+    import pr_statistics as ps
+    import members_change_attention as mca
+
+    timings = {}
+
+    def stage(name, func, *func_args):
+        start = time.perf_counter()
+        with ps.metrics.stage(name):
+            result = func(*func_args)
+        timings[name] = time.perf_counter() - start
+        return result
+
+    def render_time():
+        # render_report runs in the worker processes, the time it takes is kept for every receiver
+        seconds = sum(x['wall'] for x in ps.metrics.receivers.values())
+        ps.metrics.receivers.clear()
+        return seconds
+
+    send = ps.Mailer._send
+    ps.Mailer._send = timed(timings, 'send', send)
+    try:
+        data_dir = stage('prepare_env', ps.prepare_env)
+        sigs, sigs_list = stage('get_sigs', ps.get_sigs)
+        compare_dict = stage('all_sigs_compare', ps.all_sigs_compare, sigs_list)
+        repos_pulls_mapping = stage('get_repos_pulls_mapping', ps.get_repos_pulls_mapping)
+        sent = sink.messages
+        render_time()
+        stage('pr_statistics', ps.pr_statistics, data_dir, sigs, repos_pulls_mapping, compare_dict, workers)
+        job_timings = {'render': render_time(), 'send': timings.pop('send', 0)}
+        # the workbook of a receiver of every Pull Request of every sig
+        open_pr_dict, _, _ = ps.collect_open_prs(sigs, [list(repos_pulls_mapping.items())])
+        pr_list = ps.order_pr_list({id(x): x for rows in open_pr_dict.values() for x in rows}.values())
+        stage('workbook', ps.build_workbook, os.path.join(data_dir, 'benchmark.xlsx'), pr_list, compare_dict)
+        if os.path.exists(mca.lgtm_cache_file):
+            os.remove(mca.lgtm_cache_file)
+        open_pr_list = stage('get_open_pulls', mca.get_open_pulls)
+        stage('members_pr_statistics', mca.pr_statistics, data_dir, open_pr_list, workers)
+        timings['members_render'] = render_time()
+        timings['members_send'] = timings.pop('send', 0)
+        timings.update(job_timings)
+        timings['emails'] = sink.messages - sent
+    finally:
+        ps.Mailer._send = send
+    return timings
+
+
+def measure_memory():
+    """
+    Trace the allocations of routing the open pulls to the receivers, once from the whole pulls list and once from
+    the pages as they arrive
+    :return: peak bytes of both ways
+    """
+    import tracemalloc
+    import pr_statistics as ps
+
+    sigs, _ = ps.get_sigs()
+    peaks = []
+    for collect in [lambda: ps.collect_open_prs(sigs, [list(ps.get_repos_pulls_mapping().items())]),
+                    lambda: ps.collect_open_prs(sigs, ps.iter_repos_pulls())]:
+        tracemalloc.start()
+        result = collect()
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        del result
+    return peaks
+
+
+def measure_startup(workdir, repeat):
+    """
+    Import the entry points in fresh interpreters with -X importtime
+    :param workdir: working directory of the interpreters
+    :param repeat: number of interpreters, the fastest import is kept
+    :return: import time in seconds, heavy modules loaded by the import
+    """
+    code = 'import sys, members_change_attention; print(",".join(x for x in {!r} if x in sys.modules))'.format(
+        heavy_modules)
+    env = dict(os.environ, PYTHONPATH=repo_dir)
+    seconds, heavy = None, []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=workdir, env=env,
+                                capture_output=True, text=True, check=True)
+        # the cumulative microseconds of the entry point are in the line of the module itself
+        line = [x for x in result.stderr.splitlines() if x.endswith('| members_change_attention')][-1]
+        elapsed = int(line.split('|')[1]) / 1000000
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+        heavy = [x for x in result.stdout.strip().split(',') if x]
+    return seconds, heavy
+
+
+def compare_baseline(key, timings, baseline, tolerance):
+    """
+    Print the timings next to the baseline
+    :return: names of the stages slower than the baseline by more than the tolerance
+    """
+    regressions = []
+    print('{:<24}{:>12}{:>12}{:>10}'.format('stage', 'seconds', 'baseline', 'change'))
+    for name in stages:
+        seconds = timings[name]
+        base = baseline.get(name)
+        if base is None:
+            print('{:<24}{:>12.3f}{:>12}{:>10}'.format(name, seconds, '-', '-'))
+            continue
+        change = (seconds - base) / base if base else 0
+        # differences below 50ms are noise
+        regressed = change > tolerance and seconds - base > 0.05
+        if regressed:
+            regressions.append(name)
+        print('{:<24}{:>12.3f}{:>12.3f}{:>9.0%}{}'.format(name, seconds, base, change, ' !' if regressed else ''))
+    print('emails sent per run: {}, baseline key: {}'.format(timings.get('emails'), key))
+    return regressions
+
+
+def compare_workers(results):
+    """
+    Print how the report jobs scale with the number of rendering processes
+    :param results: a dict of {workers: {stage: seconds}}
+    """
+    print('{:<10}{:>16}{:>12}{:>24}{:>12}'.format('workers', 'pr_statistics', 'render', 'members_pr_statistics',
+                                                  'speedup'))
+    base = results[min(results)]['pr_statistics']
+    for workers, timings in sorted(results.items()):
+        print('{:<10}{:>16.3f}{:>12.3f}{:>24.3f}{:>11.2f}x'.format(
+            workers, timings['pr_statistics'], timings['render'], timings['members_pr_statistics'],
+            base / timings['pr_statistics']))
+    print('render is the time of render_report summed over the processes')
+
+
+def main():
+    args = parse_args()
+    key = 'sigs={} repos={} prs={} receivers={} community_prs={} workers={}'.format(
+        args.sigs, args.repos, args.prs, args.receivers, args.community_prs, '{}')
+    workdir = tempfile.mkdtemp(prefix='pr-statistics-benchmark-')
+    try:
+        fixtures = Fixtures(args)
+        fixtures.write_community(os.path.join(workdir, 'upstream'))
+        ApiHandler.fixtures = fixtures
+        api = start_server(ThreadingHTTPServer(('127.0.0.1', 0), ApiHandler))
+        sink = start_server(SmtpSink())
+        api_url = 'http://127.0.0.1:{}'.format(api.server_address[1])
+        os.environ.update({
+            'COMMUNITY_URL': 'file://' + os.path.join(workdir, 'upstream'),
+            'IPB_URL': api_url + '/ipb',
+            'DSAPI_URL': api_url + '/dsapi',
+            'GITEE_API_URL': api_url + '/gitee',
+            'ACCESS_TOKEN': 'benchmark',
+            'GITEE_RATE': '0',
+            'HTTP_CACHE_DIR': '',
+            'PR_SNAPSHOT_DB': '',
+            'RATE_MEMO_DB': '',
+            'REPORT_UNCHANGED': 'send',
+            'SMTP_HOST': '127.0.0.1',
+            'SMTP_PORT': str(sink.server_address[1]),
+            'SMTP_SENDER': 'benchmark@example.com',
+            'SMTP_STARTTLS': 'false',
+            'SMTP_RATE': '0'
+        })
+        shutil.copy(os.path.join(repo_dir, 'need_review.yaml'), workdir)
+        startup, heavy = measure_startup(workdir, args.repeat)
+        os.chdir(workdir)
+        sys.path.insert(0, repo_dir)
+        import pr_statistics
+        pr_statistics.log.logger.setLevel('ERROR')
+        if args.profile:
+            pr_statistics.metrics.enable_profiling()
+        results = {}
+        for workers in args.workers:
+            timings = {'startup': startup}
+            for _ in range(args.repeat):
+                for name, seconds in run_stages(args, sink, workers).items():
+                    timings[name] = min(timings.get(name, seconds), seconds)
+            results[workers] = timings
+        if args.memory:
+            peaks = measure_memory()
+        if args.profile:
+            os.makedirs(args.profile, exist_ok=True)
+            pr_statistics.metrics.dump_profiles(args.profile)
+    finally:
+        os.chdir(repo_dir)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baselines = json.load(f)
+    regressions = []
+    for workers, timings in results.items():
+        regressions += compare_baseline(key.format(workers), timings, baselines.get(key.format(workers), {}),
+                                        args.tolerance)
+        if key.format(workers) not in baselines and not args.save_baseline:
+            print('WARNING: {} has no baseline for {}, no regression can be found. Timings depend on the machine, '
+                  'run once with --save-baseline on it first.'.format(args.baseline, key.format(workers)),
+                  file=sys.stderr)
+    if len(results) > 1:
+        compare_workers(results)
+    if args.memory:
+        print('collect_open_prs peak memory: {:.1f} MiB from the pulls list, {:.1f} MiB from the pages'.format(
+            *[x / 1024 / 1024 for x in peaks]))
+    if heavy:
+        print('Loaded at startup: {}'.format(', '.join(heavy)))
+        regressions.append('startup')
+    if args.save_baseline:
+        for workers, timings in results.items():
+            baselines[key.format(workers)] = timings
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print('Baseline saved to {}'.format(args.baseline))
+    elif regressions and not args.profile:
+        print('Slower than the baseline: {}'.format(', '.join(regressions)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,34 @@
-import codecs
-import csv
+import argparse
+import bisect
+import collections
+import contextlib
 import datetime
+import functools
+import hashlib
+import html
+import itertools
+import json
 import logging
-import openpyxl
+import multiprocessing
 import os
-import pandas as pd
+import queue
+import re
 import requests
 import smtplib
+import sqlite3
 import subprocess
 import sys
+import threading
 import time
 import yaml
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from logging import handlers
-from openpyxl.styles import Alignment, Border, PatternFill, Side, Font
-from xlsx2html import xlsx2html
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib.parse import urlparse
+from urllib3.util.retry import Retry
 
 
 class Logger(object):
@@ -34,13 +47,476 @@ class Logger(object):
         self.logger.setLevel(self.level_relations.get(level))
         sh = logging.StreamHandler()
         sh.setFormatter(format_str)
-        th = handlers.TimedRotatingFileHandler(filename=filename, when=when, backupCount=backCount, encoding='utf-8')
+        th = handlers.TimedRotatingFileHandler(filename=filename, when=when, backupCount=backCount, encoding='utf-8',
+                                               delay=True)
         th.setFormatter(format_str)
         self.logger.addHandler(sh)
         self.logger.addHandler(th)
 
 
+class Metrics(object):
+    def __init__(self):
+        """
+        Timings and counters of a run, exported as a JSON summary and a Prometheus textfile at the end of the run
+        """
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.receivers = {}
+        self.http = {}
+        self.counters = {}
+        # number of top functions and allocations in the profile reports, 0 while profiling is off
+        self.profile_top = 0
+        self.profiles = []
+        self._profiling = False
+
+    def enable_profiling(self, top=25):
+        """
+        Profile every outermost stage with cProfile and tracemalloc from now on, see dump_profiles
+        :param top: number of top functions and allocations in the reports
+        """
+        import tracemalloc
+        self.profile_top = top
+        tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Add the wall and CPU time of the block to a stage, profile it if profiling is enabled
+        :param name: name of the stage
+        """
+        profile = self.profile_top and not self._profiling
+        if profile:
+            profiler, snapshot = self._start_profile()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            with self.lock:
+                stage = self.stages.setdefault(name, {'wall': 0.0, 'cpu': 0.0})
+                stage['wall'] += time.perf_counter() - wall
+                stage['cpu'] += time.process_time() - cpu
+            if profile:
+                self._stop_profile(name, profiler, snapshot)
+
+    def _start_profile(self):
+        import cProfile
+        import tracemalloc
+        self._profiling = True
+        tracemalloc.reset_peak()
+        snapshot = tracemalloc.take_snapshot()
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler, snapshot
+
+    def _stop_profile(self, name, profiler, snapshot):
+        import tracemalloc
+        profiler.disable()
+        allocations = tracemalloc.take_snapshot().compare_to(snapshot, 'lineno')[:self.profile_top]
+        peak = tracemalloc.get_traced_memory()[1]
+        self.profiles.append((name, profiler, allocations, peak))
+        self._profiling = False
+
+    def dump_profiles(self, data_dir):
+        """
+        Write the pstats file, the top functions by cumulative time and the top allocations of every profiled stage.
+        Only the thread running the stage is profiled, the time of the HTTP and SMTP threads shows up as waiting.
+        :param data_dir: directory to write the reports
+        """
+        import pstats
+        for i, (name, profiler, allocations, peak) in enumerate(self.profiles):
+            prefix = os.path.join(data_dir, 'profile_{:02d}_{}'.format(i, name))
+            profiler.dump_stats(prefix + '.pstats')
+            with open(prefix + '_functions.txt', 'w', encoding='utf-8') as f:
+                pstats.Stats(profiler, stream=f).sort_stats('cumulative').print_stats(self.profile_top)
+            with open(prefix + '_allocations.txt', 'w', encoding='utf-8') as f:
+                f.write('Peak traced memory: {:.1f} KiB\n'.format(peak / 1024))
+                f.write('Top {} allocations by growth:\n'.format(len(allocations)))
+                for stat in allocations:
+                    f.write('{}\n'.format(stat))
+        log.logger.info('Write profiles of {} stages into {}'.format(len(self.profiles), data_dir))
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def receiver(self, receiver, wall, cpu, rows):
+        """
+        Record the time to render the report of a receiver
+        """
+        with self.lock:
+            self.receivers[receiver] = {'wall': wall, 'cpu': cpu, 'rows': rows}
+
+    def http_request(self, url, seconds, size, error=False, cached=False):
+        """
+        Record an HTTP request, requests are grouped by host and path with numbers replaced. A response served from
+        the cache without asking the server is only counted as cached, it is not an upstream request.
+        """
+        parsed = urlparse(url)
+        endpoint = parsed.netloc + re.sub(r'/\d+(?=/|$)', '/{number}', parsed.path)
+        with self.lock:
+            stats = self.http.setdefault(endpoint, {'requests': 0, 'cached': 0, 'errors': 0, 'seconds': 0.0,
+                                                    'bytes': 0})
+            if cached:
+                stats['cached'] += 1
+                return
+            stats['requests'] += 1
+            stats['errors'] += int(error)
+            stats['seconds'] += seconds
+            stats['bytes'] += size
+
+    def summary(self, job):
+        return {
+            'job': job,
+            'timestamp': int(time.time()),
+            'stages': self.stages,
+            'receivers': self.receivers,
+            'http': self.http,
+            'counters': self.counters
+        }
+
+    def prometheus(self, job):
+        """
+        Format the metrics in the Prometheus text exposition format
+        :param job: name of the job, added as the job label
+        :return: text of the metrics
+        """
+        def escape(value):
+            return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+        metrics = {}
+
+        def add(name, help_text, value, **labels):
+            labels = ','.join('{}="{}"'.format(k, escape(v)) for k, v in dict(job=job, **labels).items())
+            metrics.setdefault(name, (help_text, []))[1].append('{}{{{}}} {}'.format(name, labels, value))
+
+        add('pr_report_last_run_timestamp_seconds', 'Time when the run ended', int(time.time()))
+        for name, stage in self.stages.items():
+            add('pr_report_stage_seconds', 'Wall time of a stage', round(stage['wall'], 6), stage=name)
+            add('pr_report_stage_cpu_seconds', 'CPU time of the process during a stage', round(stage['cpu'], 6),
+                stage=name)
+        for endpoint, stats in self.http.items():
+            add('pr_report_http_requests', 'HTTP requests of an endpoint', stats['requests'], endpoint=endpoint)
+            add('pr_report_http_cached', 'Responses of an endpoint served from the cache without a request',
+                stats['cached'], endpoint=endpoint)
+            add('pr_report_http_errors', 'Failed HTTP requests of an endpoint', stats['errors'], endpoint=endpoint)
+            add('pr_report_http_seconds', 'Total latency of an endpoint', round(stats['seconds'], 6),
+                endpoint=endpoint)
+            add('pr_report_http_bytes', 'Bytes received from an endpoint', stats['bytes'], endpoint=endpoint)
+        walls = [x['wall'] for x in self.receivers.values()]
+        add('pr_report_receivers', 'Receivers whose report is rendered', len(walls))
+        add('pr_report_receiver_seconds_sum', 'Total time to render the reports', round(sum(walls), 6))
+        add('pr_report_receiver_seconds_max', 'Longest time to render a report', round(max(walls, default=0), 6))
+        for name, value in self.counters.items():
+            add('pr_report_{}'.format(name), 'Counter {} of the run'.format(name), value)
+        lines = []
+        for name, (help_text, samples) in metrics.items():
+            lines.append('# HELP {} {}'.format(name, help_text))
+            lines.append('# TYPE {} gauge'.format(name))
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+    def export(self, job):
+        """
+        Write the JSON summary and the Prometheus textfile of the run, see metrics_json and metrics_textfile
+        :param job: name of the job
+        """
+        outputs = [(metrics_json, lambda: json.dumps(self.summary(job), indent=2)),
+                   (metrics_textfile, lambda: self.prometheus(job))]
+        for path, content in outputs:
+            if not path:
+                continue
+            path = path.format(job=job)
+            tmp = path + '.tmp'
+            try:
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    f.write(content())
+                os.replace(tmp, path)
+            except OSError as e:
+                log.logger.error('Fail to export metrics to {}: {}'.format(path, e))
+                continue
+            log.logger.info('Export metrics to {}'.format(path))
+
+
 log = Logger('statistics.log', level='debug')
+metrics = Metrics()
+community_url = os.getenv('COMMUNITY_URL', 'https://gitee.com/openeuler/community.git')
+dsapi_url = os.getenv('DSAPI_URL', 'https://dsapi.osinfra.cn')
+ipb_url = os.getenv('IPB_URL', 'https://ipb.osinfra.cn')
+gitee_api_url = os.getenv('GITEE_API_URL', 'https://gitee.com/api/v5')
+http_timeout = int(os.getenv('HTTP_TIMEOUT', '30'))
+http_retries = int(os.getenv('HTTP_RETRIES', '3'))
+http_concurrency = int(os.getenv('HTTP_CONCURRENCY', '16'))
+report_xlsx = os.getenv('REPORT_XLSX', '').lower() in ['1', 'true', 'yes']
+# every receiver is sent a newly rendered report (send), or receivers whose rows are unchanged since their last sent
+# report are skipped (skip) or sent the archived report again (resend)
+report_unchanged = os.getenv('REPORT_UNCHANGED', 'send').lower()
+report_archive_dir = os.getenv('REPORT_ARCHIVE_DIR', 'reports')
+# where the metrics of a run are exported, {job} is replaced by the name of the job and an empty value disables it,
+# point METRICS_TEXTFILE to the directory of the node_exporter textfile collector to scrape the run
+metrics_json = os.getenv('METRICS_JSON', 'metrics_{job}.json')
+metrics_textfile = os.getenv('METRICS_TEXTFILE', '')
+report_header = ['仓库', '目标分支', '编号', '标题', '状态', '开启天数']
+# fill colours of the open days: up to 7 days, up to 30 days, up to 365 days and longer
+duration_colors = [(7, None), (30, 'FFDAB9'), (365, 'FF7F50'), (float('inf'), 'FF4500')]
+status_color = 'FFFF00'
+# abnormal states of a Pull Request are bits of its status, they are listed in this order, no bit means 待合入
+status_draft, status_cla_failed, status_ci_failed, status_conflict, status_wait_for_update = 1, 2, 4, 8, 16
+status_names = [(status_draft, '草稿'), (status_cla_failed, 'CLA认证失败'), (status_ci_failed, '门禁检查失败'),
+                (status_conflict, '存在冲突'), (status_wait_for_update, '等待更新')]
+_cell_style = 'border: 1px solid #000000;height: 19pt'
+report_styles = {
+    'sig': _cell_style + ';font-size: 20px;font-weight: bold;text-align: center;vertical-align: middle',
+    'compare': _cell_style + ';color: #FF0000;text-align: center;vertical-align: middle',
+    'header': _cell_style + ';font-weight: bold;text-align: center;vertical-align: middle',
+    'cell': _cell_style + ';font-size: 11px',
+    'center': _cell_style + ';font-size: 11px;text-align: center;vertical-align: middle'
+}
+report_template = '''<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <title>Title</title>
+</head>
+<body>
+<table style="border-collapse: collapse" border="0" cellspacing="0" cellpadding="0">
+{}
+</table>
+</body>
+</html>
+'''
+http_cache_dir = os.getenv('HTTP_CACHE_DIR', 'cache')
+http_cache_max_bytes = int(os.getenv('HTTP_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+# seconds during which a cached response is used without asking the server again
+http_cache_ttls = {
+    'pulls': int(os.getenv('HTTP_CACHE_TTL_PULLS', '600')),
+    'rates': int(os.getenv('HTTP_CACHE_TTL_RATES', '86400'))
+}
+# SQLite file keeping daily snapshots of open Pull Requests, an empty value disables it
+pr_snapshot_db = os.getenv('PR_SNAPSHOT_DB', 'pr_snapshots.db')
+# days between the two processed rates to compare
+compare_days = int(os.getenv('COMPARE_DAYS', '7'))
+# SQLite file memoizing PR counts of sigs by timestamp, an empty value disables it
+rate_memo_db = os.getenv('RATE_MEMO_DB', 'processed_rates.db')
+# days after which a memoized count is evicted, it has to outlive the compare window
+rate_memo_days = max(int(os.getenv('RATE_MEMO_DAYS', '30')), compare_days + 1)
+# set by --refresh-rates, the counts are then asked from dsapi past both the memo and the HTTP cache
+refresh_rates = False
+_session = None
+_http_cache = None
+# stages of main() run concurrently, the shared HTTP session and cache are created once under this lock
+_http_lock = threading.Lock()
+_rate_memo = None
+_rate_memo_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Get the HTTP session shared by all upstream requests, its connections are pooled and failures are retried
+    :return: requests.Session
+    """
+    global _session
+    with _http_lock:
+        if _session is None:
+            retry = Retry(total=http_retries, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                          allowed_methods=['GET'])
+            adapter = HTTPAdapter(pool_connections=http_concurrency, pool_maxsize=http_concurrency,
+                                  max_retries=retry)
+            _session = requests.Session()
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+    return _session
+
+
+class CachedResponse(object):
+    def __init__(self, entry, revalidated=False):
+        # a revalidated response has been confirmed by the server, the others are served without asking it
+        self.revalidated = revalidated
+        self.status_code = entry['status_code']
+        self.headers = CaseInsensitiveDict(entry['headers'])
+        self.text = entry['text']
+
+    @property
+    def content(self):
+        return self.text.encode('utf-8')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class HttpCache(object):
+    # only these headers are kept, they are all that the callers read
+    kept_headers = ['total_count', 'total_page']
+
+    def __init__(self, cache_dir, max_bytes):
+        """
+        On-disk cache of GET responses, revalidated by ETag/Last-Modified and bounded by LRU eviction
+        :param cache_dir: directory to store the responses
+        :param max_bytes: maximum size of the directory
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.stats = {'hit': 0, 'revalidated': 0, 'miss': 0, 'evicted': 0}
+        self.lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.size = sum(os.path.getsize(os.path.join(cache_dir, x)) for x in os.listdir(cache_dir))
+
+    def _path(self, url, params):
+        key = json.dumps([url, sorted(params.items())], default=str)
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def _count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def _load(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, path, entry):
+        tmp_path = '{}.{}.tmp'.format(path, threading.get_ident())
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        with self.lock:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            self.size += os.path.getsize(path) - old_size
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """
+        Remove the least recently used responses until the cache is below 90% of its maximum size
+        """
+        paths = [os.path.join(self.cache_dir, x) for x in os.listdir(self.cache_dir) if x.endswith('.json')]
+        for path in sorted(paths, key=os.path.getmtime):
+            if self.size <= self.max_bytes * 0.9:
+                break
+            self.size -= os.path.getsize(path)
+            os.remove(path)
+            self.stats['evicted'] += 1
+
+    def get(self, url, params, ttl):
+        """
+        Get a response from the cache, or from the server with a conditional request
+        :param url: url of the request
+        :param params: query parameters
+        :param ttl: seconds during which a cached response is fresh
+        :return: a response object with status_code, headers and json()
+        """
+        path = self._path(url, params)
+        entry = self._load(path)
+        headers = {}
+        if entry:
+            if time.time() - entry['stored_at'] < ttl:
+                self._count('hit')
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+                return CachedResponse(entry)
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        r = get_session().get(url, params=params, headers=headers, timeout=http_timeout)
+        if r.status_code == 304 and entry:
+            self._count('revalidated')
+            entry['stored_at'] = time.time()
+            self._store(path, entry)
+            return CachedResponse(entry, revalidated=True)
+        self._count('miss')
+        if r.status_code == 200:
+            entry = {
+                'status_code': r.status_code,
+                'headers': {k: r.headers[k] for k in self.kept_headers if k in r.headers},
+                'text': r.text,
+                'etag': r.headers.get('ETag'),
+                'last_modified': r.headers.get('Last-Modified'),
+                'stored_at': time.time()
+            }
+            self._store(path, entry)
+        return r
+
+
+def http_get(url, params, ttl):
+    """
+    Send a GET request to an upstream API through the on-disk cache, the cache is disabled by an empty HTTP_CACHE_DIR
+    :param url: url of the request
+    :param params: query parameters
+    :param ttl: seconds during which a cached response is used without asking the server
+    :return: a response object with status_code, headers and json()
+    """
+    global _http_cache
+    start = time.perf_counter()
+    try:
+        if not http_cache_dir:
+            r = get_session().get(url, params=params, timeout=http_timeout)
+        else:
+            with _http_lock:
+                if _http_cache is None:
+                    _http_cache = HttpCache(http_cache_dir, http_cache_max_bytes)
+            r = _http_cache.get(url, params, ttl)
+    except requests.RequestException:
+        metrics.http_request(url, time.perf_counter() - start, 0, error=True)
+        raise
+    if isinstance(r, CachedResponse):
+        # the body of a revalidated response comes from the cache, the server only answers 304
+        metrics.http_request(url, time.perf_counter() - start, 0, cached=not r.revalidated)
+    else:
+        metrics.http_request(url, time.perf_counter() - start, len(r.content), error=r.status_code >= 400)
+    return r
+
+
+def log_http_cache_stats():
+    """
+    Log hit and miss counters of the HTTP cache
+    """
+    if _http_cache is None:
+        return
+    stats = _http_cache.stats
+    for name, value in stats.items():
+        metrics.count('http_cache_{}'.format(name), value)
+    total = stats['hit'] + stats['revalidated'] + stats['miss']
+    log.logger.info('HTTP cache: {} hits, {} revalidated, {} misses, {} evicted, {} of {} requests served from cache'.
+                    format(stats['hit'], stats['revalidated'], stats['miss'], stats['evicted'],
+                           stats['hit'] + stats['revalidated'], total))
+
+
+def clone_community():
+    """
+    Make a fresh shallow clone of the community repository whose working tree only contains sig
+    :return: True if the clone succeeds
+    """
+    if os.path.exists('community'):
+        subprocess.call('rm -rf community', shell=True)
+    if subprocess.call('git clone --depth 1 --filter=blob:none --sparse {} community'.format(community_url),
+                       shell=True) != 0:
+        return False
+    return subprocess.call('git -C community sparse-checkout set sig', shell=True) == 0
+
+
+def refresh_community():
+    """
+    Fetch new commits into the persistent community checkout, clone it again only if the checkout is broken
+    :return: True if community/sig is up to date
+    """
+    if os.path.isdir(os.path.join('community', '.git')):
+        commands = [
+            'git -C community remote set-url origin {}'.format(community_url),
+            'git -C community fetch --depth 1 origin',
+            'git -C community reset --hard FETCH_HEAD',
+            'git -C community sparse-checkout set sig'
+        ]
+        for command in commands:
+            if subprocess.call(command, shell=True) != 0:
+                log.logger.warning('Fail to refresh the community checkout, clone it again')
+                break
+        else:
+            return True
+    return clone_community()
 
 
 def prepare_env():
@@ -48,10 +524,7 @@ def prepare_env():
     Prepare repository and directory
     """
     log.logger.info('=' * 25 + ' PREPARE ENVIRONMENT ' + '=' * 25)
-    if os.path.exists('community'):
-        subprocess.call('rm -rf community', shell=True)
-    subprocess.call('git clone https://gitee.com/openeuler/community.git', shell=True)
-    if not os.path.exists('community'):
+    if not refresh_community() or not os.path.exists(os.path.join('community', 'sig')):
         log.logger.error('Fail to clone code, exit...')
         sys.exit(1)
     data_dir = 'data'
@@ -65,34 +538,120 @@ def prepare_env():
     return data_dir
 
 
+class CommunityIndex(object):
+    excluded = ['README.md', 'sig-template', 'sig-recycle', 'create_sig_info_template.py']
+
+    def __init__(self, sig_path):
+        """
+        Build every mapping of the community in a single pass over the sig directory
+        :param sig_path: path of the sig directory of the community repository
+        """
+        self.sig_path = sig_path
+        self.sig_repos = {}
+        self.repo_sig = {}
+        self.sig_maintainers = {}
+        self.sig_committers = {}
+        self.emails = {}
+        for i in sorted(os.listdir(sig_path)):
+            if i in self.excluded or not os.path.isdir(os.path.join(sig_path, i)):
+                continue
+            self._load_repos(i)
+            self._load_members(i)
+
+    def _load_repos(self, sig):
+        """
+        Collect repositories of a sig from its openeuler and src-openeuler directories
+        :param sig: sig name
+        """
+        repositories = []
+        for org in ['openeuler', 'src-openeuler']:
+            if org not in os.listdir(os.path.join(self.sig_path, sig)):
+                continue
+            for _, _, repos in os.walk(os.path.join(self.sig_path, sig, org)):
+                for repo in repos:
+                    full_repo = os.path.join(org, repo.split('.yaml')[0])
+                    repositories.append(full_repo)
+                    self.repo_sig[full_repo] = sig
+        self.sig_repos[sig] = repositories
+
+    def _load_members(self, sig):
+        """
+        Parse OWNERS and sig-info.yaml of a sig once to get maintainers, committers and email addresses
+        :param sig: sig name
+        """
+        owners_file = os.path.join(self.sig_path, sig, 'OWNERS')
+        sig_info_file = os.path.join(self.sig_path, sig, 'sig-info.yaml')
+        if os.path.exists(owners_file):
+            with open(owners_file, 'r', encoding='utf-8') as f:
+                maintainers = yaml.safe_load(f)['maintainers']
+            metrics.count('yaml_files')
+            self.sig_maintainers[sig] = (maintainers, False)
+            for maintainer in maintainers:
+                if maintainer not in self.emails.keys():
+                    self.emails[maintainer] = ''
+        if not os.path.exists(sig_info_file):
+            return
+        with open(sig_info_file, 'r', encoding='utf-8') as f:
+            sig_info = yaml.safe_load(f)
+        metrics.count('yaml_files')
+        maintainers = sig_info['maintainers']
+        if sig not in self.sig_maintainers.keys():
+            self.sig_maintainers[sig] = ([x['gitee_id'] for x in maintainers], True)
+        for maintainer in maintainers:
+            self.emails[maintainer['gitee_id']] = self._valid_email(maintainer.get('email'))
+        committers_mapping = {}
+        for r in sig_info.get('repositories') or []:
+            if 'committers' not in r.keys():
+                continue
+            committers = [x['gitee_id'] for x in r['committers']]
+            for repo in r['repo']:
+                committers_mapping[repo] = committers
+            for committer in r['committers']:
+                self.emails[committer['gitee_id']] = self._valid_email(committer.get('email'))
+        self.sig_committers[sig] = committers_mapping
+
+    @staticmethod
+    def _valid_email(email):
+        """
+        Normalize placeholders of an email address
+        :param email: email address in sig-info.yaml
+        :return: email address or an empty string
+        """
+        if email in ['null', 'NA'] or not email:
+            return ''
+        return email
+
+    def email_mappings(self):
+        """
+        Get mappings between gitee_id and email addresses
+        :return: a dict of {gitee_id: email} without empty addresses
+        """
+        return {k: v for k, v in self.emails.items() if v}
+
+
+_community_index = None
+
+
+def get_community_index(refresh=False):
+    """
+    Get the index of the community repository, build it at the first call
+    :param refresh: whether to rebuild the index
+    :return: CommunityIndex
+    """
+    global _community_index
+    if _community_index is None or refresh:
+        _community_index = CommunityIndex(os.path.join('community', 'sig'))
+    return _community_index
+
+
 def get_sigs():
     """
     Get relationship between sigs and repositories
     """
     log.logger.info('=' * 25 + ' GET SIGS INFO ' + '=' * 25)
-    sig_path = os.path.join('community', 'sig')
-    sigs = []
-    sigs_list = []
-    for i in sorted(os.listdir(sig_path)):
-        if i in ['README.md', 'sig-template', 'sig-recycle', 'create_sig_info_template.py']:
-            continue
-        if i not in [x['name'] for x in sigs]:
-            sigs.append({'name': i, 'repositories': []})
-            sigs_list.append(i)
-        if 'openeuler' in os.listdir(os.path.join(sig_path, i)):
-            for filesdir, _, repos in os.walk(os.path.join(sig_path, i, 'openeuler')):
-                for repo in repos:
-                    for sig in sigs:
-                        if sig['name'] == i:
-                            repositories = sig['repositories']
-                            repositories.append(os.path.join('openeuler', repo.split('.yaml')[0]))
-        if 'src-openeuler' in os.listdir(os.path.join(sig_path, i)):
-            for filesdir, _, src_repos in os.walk(os.path.join(sig_path, i, 'src-openeuler')):
-                for src_repo in src_repos:
-                    for sig in sigs:
-                        if sig['name'] == i:
-                            repositories = sig['repositories']
-                            repositories.append(os.path.join('src-openeuler', src_repo.split('.yaml')[0]))
+    index = get_community_index(refresh=True)
+    sigs = [{'name': k, 'repositories': list(v)} for k, v in index.sig_repos.items()]
+    sigs_list = list(index.sig_repos.keys())
     log.logger.info('Get sigs info.\n')
     return sigs, sigs_list
 
@@ -103,20 +662,12 @@ def get_maintainers(sig):
     :param sig: sig name
     :return: maintainers, sig_info_mark
     """
-    owners_file = os.path.join('community', 'sig', sig, 'OWNERS')
-    sig_info_file = os.path.join('community', 'sig', sig, 'sig-info.yaml')
-    if os.path.exists(owners_file):
-        with open(owners_file, 'r', encoding='utf-8') as f:
-            maintainers = yaml.load(f.read(), Loader=yaml.Loader)['maintainers']
-            return maintainers, False
-    elif os.path.exists(sig_info_file):
-        with open(sig_info_file, 'r', encoding='utf-8') as f:
-            sig_info = yaml.load(f.read(), Loader=yaml.Loader)
-            maintainers = [x['gitee_id'] for x in sig_info['maintainers']]
-            return maintainers, True
-    else:
+    index = get_community_index()
+    if sig not in index.sig_maintainers.keys():
         log.logger.error('ERROR! Find SIG {} has neither OWNERS file nor sig-info.yaml.'.format(sig))
         sys.exit(1)
+    maintainers, sig_info_mark = index.sig_maintainers[sig]
+    return list(maintainers), sig_info_mark
 
 
 def get_committers_mapping(sig):
@@ -125,22 +676,7 @@ def get_committers_mapping(sig):
     :param sig: sig name
     :return: committers_mapping
     """
-    sig_info_file = os.path.join('community', 'sig', sig, 'sig-info.yaml')
-    if not os.path.exists(sig_info_file):
-        return {}
-    with open(sig_info_file, 'r', encoding='utf-8') as f:
-        sig_info = yaml.load(f.read(), Loader=yaml.Loader)
-    repositories = sig_info.get('repositories')
-    if not repositories:
-        return {}
-    committers_mapping = {}
-    for i in repositories:
-        if 'committers' in i.keys():
-            repos = i['repo']
-            committers = [x['gitee_id'] for x in i['committers']]
-            for repo in repos:
-                committers_mapping[repo] = committers
-    return committers_mapping
+    return get_community_index().sig_committers.get(sig, {})
 
 
 def get_repo_members(maintainers, committers_mapping, repo, sig, extra_sig):
@@ -158,7 +694,7 @@ def get_repo_members(maintainers, committers_mapping, repo, sig, extra_sig):
             return maintainers
         reviewers = committers_mapping.get(repo)
         return reviewers
-    reviewers = maintainers
+    reviewers = list(maintainers)
     committers = committers_mapping.get(repo)
     if not committers:
         return reviewers
@@ -168,71 +704,78 @@ def get_repo_members(maintainers, committers_mapping, repo, sig, extra_sig):
     return reviewers
 
 
-def count_duration(start_time):
+def classify_pulls(created_at, labels, draft=None, mergeable=None, now=None):
+    """
+    Classify a batch of Pull Requests column by column against a single reference time, every distinct set of labels
+    is only looked into once
+    :param created_at: times when the Pull Requests start as YYYY-MM-DD HH:MM:SS
+    :param labels: labels of every Pull Request, a comma separated string or a frozenset of names
+    :param draft: whether every Pull Request is a draft, none is if None
+    :param mergeable: whether every Pull Request can be merged without conflicts, all can if None
+    :param now: reference time, the current time if None
+    :return: lists of the status bits, the open days and the fill colours of the open days
+    """
+    now = now or datetime.datetime.today()
+    label_status = {}
+    for key in labels:
+        if key not in label_status:
+            names = key.split(',') if isinstance(key, str) else key
+            label_status[key] = ((status_cla_failed if 'openeuler-cla/yes' not in names else 0) |
+                                 (status_ci_failed if 'ci_failed' in names else 0) |
+                                 (status_wait_for_update if 'kind/wait_for_update' in names else 0))
+    status = [label_status[x] for x in labels]
+    if draft is not None:
+        status = [x | status_draft if y else x for x, y in zip(status, draft)]
+    if mergeable is not None:
+        status = [x if y else x | status_conflict for x, y in zip(status, mergeable)]
+    duration = [(now - datetime.datetime.fromisoformat(x)).days for x in created_at]
+    uppers = [upper for upper, _ in duration_colors]
+    color = [duration_colors[bisect.bisect_left(uppers, x)][1] for x in duration]
+    return status, duration, color
+
+
+# a Pull Request in the reports, shared by all its receivers: sig, repo and branch are interned, status is a
+# combination of the status bits, duration is the number of open days and color its fill colour, the links are only
+# made when rendering
+PullRecord = collections.namedtuple('PullRecord', ['sig', 'repo', 'branch', 'number', 'url', 'title', 'status',
+                                                   'duration', 'color'])
+
+
+def pull_record(sig, repo, branch, url, title, status, duration, color):
     """
-    Count open days of a Pull Request by its start_time
-    :param start_time: time when the Pull Request starts
-    :return: duration in days
+    Make the record of a Pull Request classified by classify_pulls
+    :param sig: sig name
+    :param repo: full name of the repository
+    :param branch: target branch
+    :param url: html url of the Pull Request
+    :param title: title of the Pull Request
+    :param status: status bits
+    :param duration: open days
+    :param color: fill colour of the open days
+    :return: PullRecord
     """
-    today = datetime.datetime.today()
-    start_date = datetime.datetime.strptime(start_time, '%Y-%m-%d %H:%M:%S')
-    duration = str((today - start_date).days)
-    return duration
+    return PullRecord(sys.intern(sig), sys.intern(repo), sys.intern(branch), int(url.split('/')[-1]), url, title,
+                      status, duration, color)
 
 
 def create_email_mappings():
     """
-    Generate mappings between gitee_id and email addresses
+    Generate mappings between gitee_id and email addresses, email_mapping.yaml is only rewritten when they change
+    :return: email_mappings
     """
-    email_mappings = {}
-    if not os.path.exists('community'):
-        subprocess.call('git clone https://gitee.com/openeuler/community.git', shell=True)
-    sig_path = os.path.join('community', 'sig')
-    for i in sorted(os.listdir(sig_path)):
-        if i in ['README.md', 'sig-template', 'sig-recycle', 'create_sig_info_template.py']:
-            continue
-        log.logger.info('Starting to get email mappings of sig {}'.format(i))
-        owners_file = os.path.join(sig_path, i, 'OWNERS')
-        sig_info_file = os.path.join(sig_path, i, 'sig-info.yaml')
-        if os.path.exists(owners_file):
-            f = open(owners_file, 'r', encoding='utf-8')
-            maintainers = yaml.safe_load(f)['maintainers']
-            f.close()
-            for maintainer in maintainers:
-                if maintainer not in email_mappings.keys():
-                    email_mappings[maintainer] = ''
-        if os.path.exists(sig_info_file):
-            f = open(sig_info_file, 'r', encoding='utf-8')
-            sig_info = yaml.safe_load(f)
-            f.close()
-            maintainers = sig_info['maintainers']
-            for maintainer in maintainers:
-                maintainer_gitee_id = maintainer['gitee_id']
-                maintainer_email = maintainer.get('email')
-                if maintainer_email in ['null', 'NA'] or not maintainer_email:
-                    maintainer_email = ''
-                email_mappings[maintainer_gitee_id] = maintainer_email
-            repositories = sig_info.get('repositories')
-            if not repositories:
-                continue
-            for r in repositories:
-                if 'committers' in r.keys():
-                    commtters = r['committers']
-                    for committer in commtters:
-                        committer_gitee_id = committer['gitee_id']
-                        committer_email = committer.get('email')
-                        if committer_email in ['null', 'NA'] or not committer_email:
-                            committer_email = ''
-                        email_mappings[committer_gitee_id] = committer_email
-    ready_to_remove = []
-    for email_mapping in email_mappings:
-        if not email_mappings[email_mapping]:
-            ready_to_remove.append(email_mapping)
-    for i in ready_to_remove:
-        del email_mappings[i]
+    if not os.path.exists(os.path.join('community', 'sig')):
+        refresh_community()
+    email_mappings = get_community_index().email_mappings()
+    if os.path.exists('email_mapping.yaml'):
+        with open('email_mapping.yaml', 'r', encoding='utf-8') as f:
+            old_email_mappings = yaml.safe_load(f)
+        metrics.count('yaml_files')
+        if old_email_mappings == email_mappings:
+            return email_mappings
     # generate email_mappings.yaml
     with open('email_mapping.yaml', 'w', encoding='utf-8') as f:
         yaml.dump(email_mappings, f, default_flow_style=False)
+    return email_mappings
 
 
 def get_email_mappings():
@@ -240,85 +783,423 @@ def get_email_mappings():
     Get email_mappings
     :return: email_mappings
     """
-    create_email_mappings()
+    email_mappings = create_email_mappings()
     if not os.path.exists('email_mapping.yaml'):
         log.logger.error('ERROR! Fail to generate email_mappings.')
         return {}
-    email_mappings = yaml.safe_load(open('email_mapping.yaml'))
     return email_mappings
 
 
-def csv_to_xlsx(filepath):
+class SnapshotStore(object):
     """
-    Convert a csv file to a xlsx file
-    :param filepath: path of the csv file
-    :return: path of the xlsx file
+    Daily snapshots of the open Pull Requests of every sig. The dsapi counts of the day a sig is first fetched are
+    kept as its baseline together with the number of its pulls in the snapshot of that day, later counts only add
+    what the snapshots changed since: pulls which have left the snapshots are processed, and the open count moves by
+    as much as the snapshot count did. Snapshots older than the compare window are evicted, the baselines older than
+    the oldest kept snapshot are moved forward to it first. Pulls moved between sigs or reopened make the counts moved
+    forward drift from dsapi, so a baseline whose dsapi counts are older than two compare windows is stale and anchored
+    again on the dsapi counts of its day.
+    """
+
+    def __init__(self, path, keep_days):
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.keep_days = keep_days
+        with self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS days (day TEXT PRIMARY KEY);
+                CREATE TABLE IF NOT EXISTS snapshots (day TEXT, sig TEXT, pull TEXT, PRIMARY KEY (sig, day, pull));
+                CREATE TABLE IF NOT EXISTS baselines (sig TEXT PRIMARY KEY, day TEXT, processed INTEGER,
+                                                      open INTEGER, snapshot INTEGER, anchored TEXT);
+            """)
+            # anchored is the day of the dsapi counts the baseline is moved forward from
+            columns = [x[1] for x in self.conn.execute('PRAGMA table_info(baselines)')]
+            if 'snapshot' not in columns:
+                self.conn.execute('ALTER TABLE baselines ADD COLUMN snapshot INTEGER')
+            if 'anchored' not in columns:
+                self.conn.execute('ALTER TABLE baselines ADD COLUMN anchored TEXT')
+                self.conn.execute('UPDATE baselines SET anchored = day')
+
+    def record(self, day, sigs, pulls):
+        """
+        Replace the snapshot of a day and evict the snapshots older than the compare window
+        :param day: date as YYYY-MM-DD
+        :param sigs: a list of every sig and its repositories
+        :param pulls: open pulls like owner/repo/pulls/1
+        """
+        pulls_by_repo = {}
+        for pull in pulls:
+            pulls_by_repo.setdefault('/'.join(pull.split('/', 2)[:2]), []).append(pull)
+        rows = [(day, sig['name'], pull) for sig in sigs for full_repo in sig['repositories']
+                for pull in pulls_by_repo.get(full_repo, [])]
+        oldest = self._days_before(day, self.keep_days)
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM snapshots WHERE day = ?', (day,))
+            self.conn.executemany('INSERT OR IGNORE INTO snapshots VALUES (?, ?, ?)', rows)
+            self.conn.execute('INSERT OR IGNORE INTO days VALUES (?)', (day,))
+            # baselines may be fetched before the snapshot of their day is recorded, those of an earlier day
+            # which never got a snapshot are dropped and taken from dsapi again
+            self.conn.execute("""
+                UPDATE baselines SET snapshot = (SELECT COUNT(*) FROM snapshots s
+                                                 WHERE s.sig = baselines.sig AND s.day = baselines.day)
+                WHERE snapshot IS NULL AND day IN (SELECT day FROM days)
+            """)
+            self.conn.execute('DELETE FROM baselines WHERE snapshot IS NULL AND day < ?', (day,))
+            first_kept = self.conn.execute('SELECT MIN(day) FROM days WHERE day >= ?', (oldest,)).fetchone()[0]
+            older = [x[0] for x in self.conn.execute('SELECT sig FROM baselines WHERE day < ?', (first_kept,))]
+            if older:
+                counts = self._counts(first_kept)
+                self.conn.executemany('UPDATE baselines SET day = ?, processed = ?, open = ?, snapshot = ? '
+                                      'WHERE sig = ?', [(first_kept,) + counts[x] + (x,) for x in older if x in counts])
+            evicted = self.conn.execute('DELETE FROM snapshots WHERE day < ?', (first_kept,)).rowcount
+            self.conn.execute('DELETE FROM days WHERE day < ?', (first_kept,))
+        log.logger.info('Record {} open pulls in the snapshot of {}, evict {} older ones'.format(
+            len(rows), day, evicted))
+
+    def add_baseline(self, sig, day, processed, op):
+        """
+        Keep the dsapi counts of a sig as its baseline unless it has one
+        """
+        with self.lock, self.conn:
+            # the snapshot count is filled in by record() if the snapshot of the day is not there yet
+            snapshot = None
+            if self.conn.execute('SELECT 1 FROM days WHERE day = ?', (day,)).fetchone():
+                snapshot = self.conn.execute('SELECT COUNT(*) FROM snapshots WHERE sig = ? AND day = ?',
+                                             (sig, day)).fetchone()[0]
+            self.conn.execute('INSERT OR IGNORE INTO baselines VALUES (?, ?, ?, ?, ?, ?)',
+                              (sig, day, processed, op, snapshot, day))
+
+    @staticmethod
+    def _days_before(day, days):
+        return (datetime.datetime.strptime(day, '%Y-%m-%d') - datetime.timedelta(days=days)).strftime('%Y-%m-%d')
+
+    def stale_baselines(self, day):
+        """
+        Find the baselines moved forward from dsapi counts older than two compare windows
+        :param day: date as YYYY-MM-DD of the latest snapshot
+        :return: a list of (sig, day of the baseline)
+        """
+        with self.lock:
+            return self.conn.execute('SELECT sig, day FROM baselines WHERE snapshot IS NOT NULL AND anchored < ? '
+                                     'ORDER BY sig', (self._days_before(day, 2 * self.keep_days),)).fetchall()
+
+    def anchor(self, sig, day, processed, op):
+        """
+        Replace the counts of a baseline by the dsapi counts of its day
+        """
+        with self.lock, self.conn:
+            self.conn.execute("""
+                UPDATE baselines SET processed = ?, open = ?, anchored = day,
+                                     snapshot = (SELECT COUNT(*) FROM snapshots s
+                                                 WHERE s.sig = baselines.sig AND s.day = baselines.day)
+                WHERE sig = ? AND day = ? AND day IN (SELECT day FROM days)
+            """, (processed, op, sig, day))
+
+    def _counts(self, day):
+        """
+        Count the processed and open Pull Requests of the sigs whose baseline is complete on or before a day
+        :param day: date as YYYY-MM-DD having a snapshot
+        :return: a dict of {sig: (processed, open, pulls in the snapshot of the day)}
+        """
+        rows = self.conn.execute("""
+            WITH seen AS (
+                SELECT DISTINCT s.sig, s.pull FROM baselines b
+                JOIN snapshots s ON s.sig = b.sig AND s.day >= b.day AND s.day <= :day
+                WHERE b.day <= :day AND b.snapshot IS NOT NULL
+            ), gone AS (
+                SELECT sig, COUNT(*) AS n FROM seen
+                WHERE NOT EXISTS (SELECT 1 FROM snapshots o WHERE o.sig = seen.sig AND o.day = :day
+                                  AND o.pull = seen.pull)
+                GROUP BY sig
+            ), opened AS (
+                SELECT sig, COUNT(*) AS n FROM snapshots WHERE day = :day GROUP BY sig
+            )
+            SELECT b.sig, b.processed, b.open, b.snapshot, COALESCE(g.n, 0), COALESCE(o.n, 0)
+            FROM baselines b LEFT JOIN gone g ON g.sig = b.sig LEFT JOIN opened o ON o.sig = b.sig
+            WHERE b.day <= :day AND b.snapshot IS NOT NULL
+        """, {'day': day}).fetchall()
+        return {sig: (processed + gone, max(op + open_now - snapshot, 0), open_now)
+                for sig, processed, op, snapshot, gone, open_now in rows}
+
+    def local_sigs(self, day, pending=False):
+        """
+        Find the sigs whose processed rate of a day can be calculated from the snapshots
+        :param day: date as YYYY-MM-DD
+        :param pending: whether the snapshot of the day is about to be recorded
+        :return: a set of sig names
+        """
+        with self.lock:
+            if not pending and not self.conn.execute('SELECT 1 FROM days WHERE day = ?', (day,)).fetchone():
+                return set()
+            # a baseline of the day itself gets its snapshot count once the snapshot is recorded
+            rows = self.conn.execute('SELECT sig FROM baselines WHERE day <= ?1 AND (snapshot IS NOT NULL OR '
+                                     'day = ?1 AND ?2)', (day, pending)).fetchall()
+        return {x[0] for x in rows}
+
+    def processed_rates(self, day):
+        """
+        Calculate processed rates of all sigs having a baseline on or before a day
+        :param day: date as YYYY-MM-DD
+        :return: a dict of {sig: processed rate}, empty if there is no snapshot of the day
+        """
+        with self.lock:
+            if not self.conn.execute('SELECT 1 FROM days WHERE day = ?', (day,)).fetchone():
+                return {}
+            counts = self._counts(day)
+        return {sig: round(processed / (processed + op), 2) if processed + op else 0
+                for sig, (processed, op, _) in counts.items()}
+
+
+def get_snapshot_store():
+    """
+    Open the PR snapshot store
+    :return: SnapshotStore, None if it is disabled or cannot be opened
+    """
+    if not pr_snapshot_db:
+        return None
+    try:
+        return SnapshotStore(pr_snapshot_db, compare_days)
+    except sqlite3.Error as e:
+        log.logger.error('Fail to open PR snapshot store {}: {}'.format(pr_snapshot_db, e))
+        return None
+
+
+class RateMemo(object):
+    """
+    PR counts of sigs memoized by (community, sig, timestamp) across runs. A count at a past timestamp never
+    changes, so the count of today fetched by a run is the count of last week for the run compare_days later.
+    Runs sharing the file are serialized by SQLite.
+    """
+
+    def __init__(self, path, max_days):
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.refresh = False
+        self.stats = {'hit': 0, 'miss': 0, 'evicted': 0}
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS pr_states (community TEXT, sig TEXT, timestamp INTEGER, merged INTEGER,
+                                                      closed INTEGER, open INTEGER,
+                                                      PRIMARY KEY (community, sig, timestamp))
+            """)
+            oldest = int(time.time() - max_days * 24 * 3600) * 1000
+            self.stats['evicted'] = self.conn.execute('DELETE FROM pr_states WHERE timestamp < ?',
+                                                      (oldest,)).rowcount
+
+    def get(self, community, sig, ts):
+        """
+        :return: memoized (merged, closed, open), None if it is missing or a refresh is asked
+        """
+        with self.lock:
+            row = None
+            if not self.refresh:
+                row = self.conn.execute('SELECT merged, closed, open FROM pr_states WHERE community = ? AND sig = ? '
+                                        'AND timestamp = ?', (community, sig, ts)).fetchone()
+            self.stats['hit' if row else 'miss'] += 1
+        return row
+
+    def put(self, community, sig, ts, state):
+        """
+        Memoize counts at a timestamp which has passed, counts of a future timestamp may still change
+        """
+        if ts > time.time() * 1000:
+            return
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO pr_states VALUES (?, ?, ?, ?, ?, ?)',
+                              (community, sig, ts) + tuple(state))
+
+
+def get_rate_memo():
+    """
+    Open the memo of PR counts once
+    :return: RateMemo, None if it is disabled or cannot be opened
     """
-    if not filepath.endswith('.csv'):
+    global _rate_memo
+    if not rate_memo_db:
+        return None
+    with _rate_memo_lock:
+        if _rate_memo is None:
+            try:
+                _rate_memo = RateMemo(rate_memo_db, rate_memo_days)
+            except sqlite3.Error as e:
+                log.logger.error('Fail to open processed rate memo {}: {}'.format(rate_memo_db, e))
+                return None
+    return _rate_memo
+
+
+def log_rate_memo_stats():
+    """
+    Log hit and miss counters of the processed rate memo
+    """
+    if _rate_memo is None:
         return
-    # sorting
-    df = pd.read_csv(filepath, encoding='utf-8')
-    df.to_csv(filepath, mode='w', index=False)
-
-    csv_file = pd.read_csv(filepath, encoding='utf-8')
-    xlsx_filepath = filepath.replace('.csv', '.xlsx')
-    csv_file.to_excel(xlsx_filepath, sheet_name='open_pull_requests_statistics')
-    if not os.path.exists(xlsx_filepath):
-        log.logger.error('ERROR! Fail to generate {}'.format(xlsx_filepath))
-        sys.exit(1)
-    log.logger.info('Generate {}'.format(filepath.replace('.csv', '.xlsx')))
-    return xlsx_filepath
+    stats = _rate_memo.stats
+    for name, value in stats.items():
+        metrics.count('rate_memo_{}'.format(name), value)
+    log.logger.info('Processed rate memo: {} hits, {} misses, {} evicted'.format(stats['hit'], stats['miss'],
+                                                                               stats['evicted']))
 
 
-def cal_sig_processed_rate(sig_name, ts):
+def timestamp_day(ts):
     """
-    Calculate processed rate of Pull Requests of a sig between now and a week ago
+    Convert a timestamp in milliseconds to its local date
+    """
+    return datetime.datetime.fromtimestamp(ts // 1000).strftime('%Y-%m-%d')
+
+
+def day_timestamp(day):
+    """
+    Convert a local date to the timestamp in milliseconds at 9:00 on it, the time the processed rates are taken at
+    """
+    return int(time.mktime(datetime.datetime.strptime(day + ' 09', '%Y-%m-%d %H').timetuple())) * 1000
+
+
+def get_sig_pr_state(sig_name, ts):
+    """
+    Get counts of Pull Requests of a sig from dsapi
     :param sig_name: sig name
     :param ts: timestamp
-    :return: -1, 0 or a two bit float number
+    :return: (merged, closed, open), None if they cannot be got
     """
-    url = 'https://dsapi.osinfra.cn/query/sig/pr/state'
+    memo = get_rate_memo()
+    if memo:
+        state = memo.get('openeuler', sig_name, ts)
+        if state:
+            return state
+    url = '{}/query/sig/pr/state'.format(dsapi_url)
     params = {
         'community': 'openeuler',
         'timestamp': ts,
         'sig': sig_name
     }
-    r = requests.get(url, params=params)
+    try:
+        r = http_get(url, params, 0 if refresh_rates else http_cache_ttls['rates'])
+    except requests.RequestException as e:
+        log.logger.error('Fail to get processed rate of sig {}: {}'.format(sig_name, e))
+        return None
     if r.status_code != 200:
-        processed_rate = -1
-    else:
-        data = r.json()['data']
-        if not data:
-            return -1
-        merged, closed, op = data['merged'], data['closed'], data['open']
-        if merged == 0 and closed == 0 and op == 0:
-            return 0
-        processed_rate = round((merged + closed) / (merged + closed + op), 2)
+        return None
+    data = r.json()['data']
+    if not data:
+        return None
+    state = data['merged'], data['closed'], data['open']
+    if memo:
+        memo.put('openeuler', sig_name, ts, state)
+    return state
+
+
+def cal_sig_processed_rate(sig_name, ts, store=None):
+    """
+    Calculate processed rate of Pull Requests of a sig between now and a week ago
+    :param sig_name: sig name
+    :param ts: timestamp
+    :param store: SnapshotStore to keep the counts as baseline of the sig
+    :return: -1, 0 or a two bit float number
+    """
+    state = get_sig_pr_state(sig_name, ts)
+    if state is None:
+        return -1
+    merged, closed, op = state
+    if store:
+        store.add_baseline(sig_name, timestamp_day(ts), merged + closed, op)
+    if merged == 0 and closed == 0 and op == 0:
+        return 0
+    processed_rate = round((merged + closed) / (merged + closed + op), 2)
     return processed_rate
 
 
 def cal_compare_timestamp():
     """
-    Calculate timestamp at 9:00 on the current day and timestamp a week ago
-    :return: timestamp at 9:00 on the current day and timestamp a week ago
+    Calculate timestamp at 9:00 on the current day and timestamp compare_days (a week by default) ago
+    :return: timestamp at 9:00 on the current day and timestamp compare_days ago
     """
-    from datetime import datetime
-    today = datetime.strftime(datetime.today(), '%Y-%m-%d')
-    timestamp_today = int(time.mktime(datetime.strptime(today + ' 09', '%Y-%m-%d %H').timetuple())) * 1000
-    timestamp_last = timestamp_today - 3600 * 24 * 7 * 1000
+    timestamp_today = day_timestamp(datetime.date.today().strftime('%Y-%m-%d'))
+    timestamp_last = timestamp_today - 3600 * 24 * compare_days * 1000
     return timestamp_today, timestamp_last
 
 
-def all_sigs_compare(sigs_list):
+def remote_processed_rates(sigs_list, store=None):
+    """
+    Get from dsapi the processed rates which cannot be calculated from PR snapshots, it does not need the snapshot of
+    today to be recorded
+    :param sigs_list: a name list of all sigs
+    :param store: SnapshotStore to calculate processed rates locally and to keep the counts got from dsapi
+    :return: a dict of {timestamp: {sig: processed rate}}
+    """
+    ts_today, ts_last = cal_compare_timestamp()
+    local_sigs = {ts_today: set(), ts_last: set()}
+    if store:
+        local_sigs = {ts_today: store.local_sigs(timestamp_day(ts_today), pending=True),
+                      ts_last: store.local_sigs(timestamp_day(ts_last))}
+    wanted = [(sig_name, ts) for sig_name in sigs_list for ts in (ts_today, ts_last) if sig_name not in local_sigs[ts]]
+
+    def fetch(wanted_rate):
+        sig_name, ts = wanted_rate
+        return cal_sig_processed_rate(sig_name, ts, store if ts == ts_today else None)
+
+    rates = {ts_today: {}, ts_last: {}}
+    with ThreadPoolExecutor(max_workers=http_concurrency) as executor:
+        for (sig_name, ts), rate in zip(wanted, executor.map(fetch, wanted)):
+            rates[ts][sig_name] = rate
+    return rates
+
+
+def anchor_stale_baselines(store, day):
+    """
+    Anchor the stale baselines of the PR snapshots on the dsapi counts of their day again, a baseline which cannot be
+    got stays as it is until the next run
+    :param store: SnapshotStore
+    :param day: date as YYYY-MM-DD of the snapshot just recorded
+    """
+    stale = store.stale_baselines(day)
+    if not stale:
+        return
+
+    def fetch(baseline):
+        sig_name, baseline_day = baseline
+        return get_sig_pr_state(sig_name, day_timestamp(baseline_day))
+
+    anchored = 0
+    with ThreadPoolExecutor(max_workers=http_concurrency) as executor:
+        for (sig_name, baseline_day), state in zip(stale, executor.map(fetch, stale)):
+            if state is None:
+                continue
+            merged, closed, op = state
+            store.anchor(sig_name, baseline_day, merged + closed, op)
+            anchored += 1
+    metrics.count('baselines_anchored', anchored)
+    log.logger.info('Anchor {} of {} stale baselines on dsapi'.format(anchored, len(stale)))
+
+
+def local_processed_rates(store):
+    """
+    Calculate processed rates from PR snapshots, the snapshot of today has to be recorded
+    :param store: SnapshotStore
+    :return: a dict of {timestamp: {sig: processed rate}}
+    """
+    rates = {ts: store.processed_rates(timestamp_day(ts)) for ts in cal_compare_timestamp()}
+    log.logger.info('Calculate {} processed rates from PR snapshots'.format(sum(len(x) for x in rates.values())))
+    return rates
+
+
+def all_sigs_compare(sigs_list, store=None, rates=None):
     """
     Generate compare info of all sigs
     :param sigs_list: a name list of all sigs
+    :param store: SnapshotStore to calculate processed rates locally, dsapi is asked for the others
+    :param rates: a dict of {timestamp: {sig: processed rate}} already known, dsapi is asked for the missing ones
     :return: compare info of all sigs
     """
-    compare_dict = {}
-    for sig in sigs_list:
-        compare_info = compare_sig_processed_rate(sig)
-        compare_dict[sig] = compare_info
+    if rates is None:
+        rates = local_processed_rates(store) if store else {}
+
+    def compare(sig_name):
+        return compare_sig_processed_rate(sig_name, rates, store)
+
+    with ThreadPoolExecutor(max_workers=http_concurrency) as executor:
+        compare_infos = executor.map(compare, sigs_list)
+        compare_dict = dict(zip(sigs_list, compare_infos))
     return compare_dict
 
 
@@ -332,199 +1213,661 @@ def single_sig_compare(sig, compare_dict):
     return compare_dict.get(sig)
 
 
-def compare_sig_processed_rate(sig_name):
+def compare_sig_processed_rate(sig_name, rates=None, store=None):
     """
     Compare processed rate of a sig
     :param sig_name: sig name
+    :param rates: a dict of {timestamp: {sig: processed rate}} already known, dsapi is asked for the missing ones
+    :param store: SnapshotStore to keep the counts got from dsapi
     :return: compare info
     """
+    rates = rates or {}
     ts_today, ts_last = cal_compare_timestamp()
-    processed_rate_now = cal_sig_processed_rate(sig_name, ts_today)
-    processed_rate_last = cal_sig_processed_rate(sig_name, ts_last)
+    processed_rate_now = rates.get(ts_today, {}).get(sig_name)
+    if processed_rate_now is None:
+        processed_rate_now = cal_sig_processed_rate(sig_name, ts_today, store)
+    processed_rate_last = rates.get(ts_last, {}).get(sig_name)
+    if processed_rate_last is None:
+        processed_rate_last = cal_sig_processed_rate(sig_name, ts_last)
+    period = '上周' if compare_days == 7 else '{}天前'.format(compare_days)
     if processed_rate_now == -1 or processed_rate_last == -1:
         return ""
     else:
         if processed_rate_now == processed_rate_last:
-            return 'PR处理率为{}%, 同比上周不变'.format(processed_rate_now * 100)
+            return 'PR处理率为{}%, 同比{}不变'.format(processed_rate_now * 100, period)
         elif processed_rate_now > processed_rate_last:
             compare_rate = round(processed_rate_now - processed_rate_last, 2)
-            return 'PR处理率为{}%, 同比上周上升{}%'.format(processed_rate_now * 100, compare_rate * 100)
+            return 'PR处理率为{}%, 同比{}上升{}%'.format(processed_rate_now * 100, period, compare_rate * 100)
         elif processed_rate_now < processed_rate_last:
             compare_rate = round(processed_rate_last - processed_rate_now, 2)
-            return 'PR处理率为{}%, 同比上周下降{}%'.format(processed_rate_now * 100, compare_rate * 100)
+            return 'PR处理率为{}%, 同比{}下降{}%'.format(processed_rate_now * 100, period, compare_rate * 100)
 
 
-def excel_optimization(filepath, compare_dict):
+def status_text(status):
     """
-    Adjust styles of the xlsx file
-    :param filepath: path of the xlsx file
+    Describe the status of a Pull Request
+    :param status: status bits
+    :return: status string
+    """
+    if not status:
+        return '待合入'
+    return '、'.join(name for bit, name in status_names if status & bit)
+
+
+def number_link(pr):
+    return "<a href='{0}'>#{1}</a>".format(pr.url, pr.number)
+
+
+def title_link(pr, escape=False):
+    """
+    Link of the title of a Pull Request
+    :param pr: PullRecord
+    :param escape: whether to escape the title for the html report, the workbook shows it as it is
+    :return: link of the title
+    """
+    return "<a href='{0}'>{1}</a>".format(pr.url, html.escape(pr.title) if escape else pr.title)
+
+
+def render_cell(value, style, colspan=None):
+    """
+    Render a cell of the report table
+    :param value: html content of the cell
+    :param style: inline style of the cell
+    :param colspan: number of columns the cell spans
+    :return: html of the cell
+    """
+    if colspan:
+        return '<td colspan="{}" style="{}">{}</td>'.format(colspan, style, value)
+    return '<td style="{}">{}</td>'.format(style, value)
+
+
+def render_pr_row(pr, first_column=0):
+    """
+    Render a Pull Request row of the report table
+    :param pr: PullRecord
+    :param first_column: index of the first column to render, 2 skips repo and branch
+    :return: html of the row
+    """
+    cells = [
+        render_cell(html.escape(pr.repo), report_styles['cell']),
+        render_cell(html.escape(pr.branch), report_styles['cell']),
+        render_cell(number_link(pr), report_styles['cell']),
+        render_cell(title_link(pr, escape=True), report_styles['cell'])
+    ]
+    status_style = report_styles['cell']
+    if pr.status:
+        status_style += ';background-color: #{}'.format(status_color)
+    cells.append(render_cell(html.escape(status_text(pr.status)), status_style))
+    duration_style = report_styles['center']
+    if pr.color:
+        duration_style += ';background-color: #{}'.format(pr.color)
+    cells.append(render_cell(pr.duration, duration_style))
+    return '<tr>{}</tr>'.format(''.join(cells[first_column:]))
+
+
+def render_header_row(first_column=0):
+    """
+    Render the column header row of the report table
+    :param first_column: index of the first column to render, 2 skips repo and branch
+    :return: html of the row
+    """
+    cells = [render_cell(x, report_styles['header']) for x in report_header[first_column:]]
+    return '<tr>{}</tr>'.format(''.join(cells))
+
+
+def render_sig_rows(sig, compare_dict, first_column=0):
+    """
+    Render the rows in front of the Pull Requests of a sig: sig name, compare info and column headers
+    :param sig: sig name
     :param compare_dict: a dict of every sig and its compare info
+    :param first_column: index of the first column to render, 2 skips repo and branch
+    :return: html of the rows
     """
-    if not filepath.endswith('.xlsx'):
-        return
-    html_file = filepath.replace('.xlsx', '.html')
-    wb = openpyxl.load_workbook(filepath)
-    ws = wb.active
-    tmp_list = []
-    for row in ws.rows:
-        tmp_list.append(row[1].value)
-    insert_rows = {}
-    for i in tmp_list:
-        if i not in insert_rows.keys():
-            insert_row = tmp_list.index(i) + 1
-            insert_rows[insert_row] = i
-    # delete auxiliary column
-    ws.delete_cols(1)
-    ws.delete_cols(1)
-    # insert rows
-    alignment_center = Alignment(horizontal='center', vertical='center')
-    insert_count = 0
-    for i in sorted(insert_rows.keys()):
-        sig_name = insert_rows[i]
-        i += insert_count
-
-        ws.insert_rows(i)
-        insert_count += 1
-        ws['A' + str(i)] = sig_name
-        ws['A' + str(i)].font = Font(name='黑体', size=20, bold=True)
-        ws.merge_cells(start_row=i, end_row=i, start_column=1, end_column=6)
-        ws['A' + str(i)].alignment = alignment_center
-
-        compare_info = single_sig_compare(sig_name, compare_dict)
-        ws.insert_rows(i + 1)
-        insert_count += 1
-        ws['A' + str(i + 1)] = compare_info
-        ws['A' + str(i + 1)].font = Font(name='黑体', color='FF0000')
-        ws['A' + str(i + 1)].alignment = alignment_center
-        ws.merge_cells(start_row=i + 1, end_row=i + 1, start_column=1, end_column=6)
-
-        ws.insert_rows(i + 2)
-        insert_count += 1
-        ws['A' + str(i + 2)] = '仓库'
-        ws['B' + str(i + 2)] = '目标分支'
-        ws['C' + str(i + 2)] = '编号'
-        ws['D' + str(i + 2)] = '标题'
-        ws['E' + str(i + 2)] = '状态'
-        ws['F' + str(i + 2)] = '开启天数'
-        ws['A' + str(i + 2)].font = Font(bold=True)
-        ws['A' + str(i + 2)].alignment = alignment_center
-        ws['B' + str(i + 2)].font = Font(bold=True)
-        ws['B' + str(i + 2)].alignment = alignment_center
-        ws['C' + str(i + 2)].font = Font(bold=True)
-        ws['C' + str(i + 2)].alignment = alignment_center
-        ws['D' + str(i + 2)].font = Font(bold=True)
-        ws['D' + str(i + 2)].alignment = alignment_center
-        ws['E' + str(i + 2)].font = Font(bold=True)
-        ws['E' + str(i + 2)].alignment = alignment_center
-        ws['F' + str(i + 2)].font = Font(bold=True)
-        ws['F' + str(i + 2)].alignment = alignment_center
-
-    # replace the original table header
-    ws.insert_rows(5)
-    ws['A5'] = ws['A4'].value
-    ws['B5'] = ws['B4'].value
-    ws['C5'] = ws['C4'].value
-    ws['D5'] = ws['D4'].value
-    ws['E5'] = ws['E4'].value
-    ws['F5'] = ws['F4'].value
-    ws.delete_rows(4)
-    # fill for the Duration
-    cells = ws.iter_rows(min_row=3, min_col=6, max_col=6)
-    yellow_fill = PatternFill("solid", start_color='FFFF00')
-    first_stage_fill = PatternFill('solid', start_color='FFDAB9')
-    second_stage_fill = PatternFill('solid', start_color='FF7F50')
-    third_stage_fill = PatternFill('solid', start_color='FF4500')
-    for i in cells:
+    colspan = len(report_header) - first_column
+    compare_info = single_sig_compare(sig, compare_dict) or ''
+    return '<tr>{}</tr><tr>{}</tr>{}'.format(render_cell(html.escape(sig), report_styles['sig'], colspan),
+                                           render_cell(html.escape(compare_info), report_styles['compare'], colspan),
+                                           render_header_row(first_column))
+
+
+def render_html_report(pr_list, compare_dict, sig_rows=True, first_column=0):
+    """
+    Render the styled html report of a receiver straight from the ordered Pull Request rows
+    :param pr_list: ordered PullRecords
+    :param compare_dict: a dict of every sig and its compare info
+    :param sig_rows: whether to start every sig with its name and compare info, or to use a single table header
+    :param first_column: index of the first column to render, 2 skips repo and branch
+    :return: html of the report
+    """
+    return ReportRenderer(compare_dict, sig_rows, first_column).render(pr_list)
+
+
+class ReportRenderer(object):
+    def __init__(self, compare_dict, sig_rows=True, first_column=0):
+        """
+        Render html reports of many receivers, every sig block and every Pull Request row is rendered only once
+        :param compare_dict: a dict of every sig and its compare info
+        :param sig_rows: whether to start every sig with its name and compare info, or to use a single table header
+        :param first_column: index of the first column to render, 2 skips repo and branch
+        """
+        self.compare_dict = compare_dict
+        self.sig_rows = sig_rows
+        self.first_column = first_column
+        self.fragments = {}
+        self.pr_rows = {}
+        self.rendered = 0
+        self.reused = 0
+
+    def render_block(self, sig, prs):
+        """
+        Get the html of a sig block, keyed by the sig and the Pull Requests it contains
+        :param sig: sig name
+        :param prs: ordered PullRecords of the sig
+        :return: html of the block
+        """
+        key = (sig, tuple(pr.url for pr in prs))
+        fragment = self.fragments.get(key)
+        if fragment is not None:
+            self.reused += 1
+            return fragment
+        self.rendered += 1
+        rows = []
+        if self.sig_rows:
+            rows.append(render_sig_rows(sig, self.compare_dict, self.first_column))
+        for pr in prs:
+            row = self.pr_rows.get(pr.url)
+            if row is None:
+                row = render_pr_row(pr, self.first_column)
+                self.pr_rows[pr.url] = row
+            rows.append(row)
+        fragment = '\n'.join(rows)
+        self.fragments[key] = fragment
+        return fragment
+
+    def render(self, pr_list):
+        """
+        Render the report of a receiver by combining the sig blocks
+        :param pr_list: ordered PullRecords
+        :return: html of the report
+        """
+        blocks = []
+        if not self.sig_rows:
+            blocks.append(render_header_row(self.first_column))
+        for sig, prs in itertools.groupby(pr_list, key=lambda x: x.sig):
+            blocks.append(self.render_block(sig, list(prs)))
+        return report_template.format('\n'.join(blocks))
+
+
+_report_renderer = None
+
+
+def init_report_worker(compare_dict, sig_rows=True, first_column=0):
+    """
+    Create the report renderer of the current process
+    :param compare_dict: a dict of every sig and its compare info
+    :param sig_rows: whether to start every sig with its name and compare info, or to use a single table header
+    :param first_column: index of the first column to render, 2 skips repo and branch
+    """
+    global _report_renderer
+    _report_renderer = ReportRenderer(compare_dict, sig_rows, first_column)
+
+
+def order_pr_list(pr_list):
+    """
+    Order the Pull Requests of a receiver by sig, then by open days from the longest,
+    Pull Requests with equal keys keep their original order
+    :param pr_list: PullRecords
+    :return: ordered PullRecords
+    """
+    return sorted(pr_list, key=lambda x: (x.sig, -x.duration))
+
+
+def render_report(receiver, pr_list, xlsx_file=None):
+    """
+    Order the Pull Requests of a receiver and render the report, runs in a report worker
+    :param receiver: Gitee ID of the receiver
+    :param pr_list: PullRecords
+    :param xlsx_file: path of the xlsx file to write, None if the workbook is not wanted
+    :return: html of the report, number of sig blocks rendered and reused, wall and CPU time of the rendering
+    """
+    wall, cpu = time.perf_counter(), time.thread_time()
+    renderer = _report_renderer
+    rendered, reused = renderer.rendered, renderer.reused
+    ordered_pr_list = order_pr_list(pr_list)
+    if xlsx_file:
+        build_workbook(xlsx_file, ordered_pr_list, renderer.compare_dict, renderer.sig_rows, renderer.first_column)
+    report_html = renderer.render(ordered_pr_list)
+    log.logger.info('Rendered the report of {} with {} Pull Requests'.format(receiver, len(ordered_pr_list)))
+    return (report_html, renderer.rendered - rendered, renderer.reused - reused, time.perf_counter() - wall,
+            time.thread_time() - cpu)
+
+
+class ReportArchive(object):
+    def __init__(self, name):
+        """
+        Digests of the rows of the last report sent to every receiver, and the rendered reports when they are to be
+        sent again, kept under report_archive_dir across runs
+        :param name: name of the report, every report has its own archive
+        """
+        self.path = os.path.join(report_archive_dir, name)
+        os.makedirs(self.path, exist_ok=True)
+        self.digests_file = os.path.join(self.path, 'digests.json')
+        self.lock = threading.Lock()
         try:
-            value = int(i[0].value)
-            if 7 < value <= 30:
-                i[0].fill = first_stage_fill
-            elif 30 < value <= 365:
-                i[0].fill = second_stage_fill
-            elif value > 365:
-                i[0].fill = third_stage_fill
-        except (TypeError, ValueError):
-            pass
-    # fill for the status mark
-    status = ws.iter_rows(min_row=3, min_col=5, max_col=5)
-    for j in status:
-        value = j[0].value
-        if not value:
-            continue
-        elif len(value) <= 3 and value != '草稿':
+            with open(self.digests_file, 'r', encoding='utf-8') as f:
+                self.digests = json.load(f)
+        except (OSError, ValueError):
+            self.digests = {}
+
+    @staticmethod
+    def digest(pr_list, *context):
+        """
+        Digest the ordered rows of a receiver, open days only count by their colour so that a report does not
+        change every day just because its Pull Requests get older
+        :param pr_list: ordered PullRecords
+        :param context: anything else the report depends on
+        :return: hex digest
+        """
+        # the rows are digested as they are shown, so that the digests of the archive keep matching the reports
+        rows = [[x.sig, x.repo, x.branch, number_link(x), title_link(x, escape=True), status_text(x.status),
+                 x.color] for x in pr_list]
+        content = json.dumps([rows, context], ensure_ascii=False, default=str)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def unchanged(self, receiver, digest):
+        return self.digests.get(receiver) == digest
+
+    def _html_path(self, receiver):
+        return os.path.join(self.path, '{}.html'.format(receiver))
+
+    def load_html(self, receiver):
+        """
+        :return: html of the archived report, None if there is none
+        """
+        try:
+            with open(self._html_path(receiver), 'r', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def save_html(self, receiver, report_html):
+        with open(self._html_path(receiver), 'w', encoding='utf-8') as f:
+            f.write(report_html)
+
+    def sent(self, receiver, digest):
+        """
+        Record the digest of a report once it is sent
+        """
+        with self.lock:
+            self.digests[receiver] = digest
+
+    def save(self, receivers):
+        """
+        Store the digests, those of receivers who are not in this run are dropped with their archived reports
+        :param receivers: receivers of this run
+        """
+        for receiver in [x for x in self.digests if x not in receivers]:
+            del self.digests[receiver]
+            try:
+                os.remove(self._html_path(receiver))
+            except OSError:
+                pass
+        tmp = self.digests_file + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.digests, f)
+        os.replace(tmp, self.digests_file)
+
+
+def deliver_reports(data_dir, open_pr_dict, email_mappings, compare_dict, email_builder, workers=1, sig_rows=True,
+                    first_column=0, archive_name='statistics'):
+    """
+    Render the report of every receiver, on a pool of processes if workers > 1, and send them from this process.
+    Receivers whose rows are unchanged since their last sent report are handled by report_unchanged.
+    :param data_dir: directory to store temporary data
+    :param open_pr_dict: a dict of every receiver and its Pull Requests
+    :param email_mappings: mappings between gitee_id and email addresses
+    :param compare_dict: a dict of every sig and its compare info
+    :param email_builder: function to build the email from the html, the receiver and the addresses
+    :param workers: number of processes to render reports
+    :param sig_rows: whether to start every sig with its name and compare info, or to use a single table header
+    :param first_column: index of the first column to render, 2 skips repo and branch
+    :param archive_name: name of the report archive
+    """
+    archive = None
+    if report_unchanged in ['skip', 'resend']:
+        archive = ReportArchive(archive_name)
+    jobs = []
+    digests = {}
+    resend = []
+    for receiver in sorted(list(open_pr_dict.keys())):
+        email_address = email_mappings.get(receiver)
+        if not email_address:
+            log.logger.warning('Ready to send statistics for {} but cannot find the email address'.format(receiver))
             continue
+        if archive:
+            ordered_pr_list = order_pr_list(open_pr_dict[receiver])
+            # the compare info of the sigs is part of the report as well
+            sigs = [sig for sig, _ in itertools.groupby(ordered_pr_list, key=lambda x: x.sig)]
+            digest = archive.digest(ordered_pr_list, email_address, sig_rows, first_column, report_template,
+                                    report_styles, [compare_dict.get(sig) for sig in sigs])
+            digests[receiver] = digest
+            if archive.unchanged(receiver, digest):
+                if report_unchanged == 'skip':
+                    log.logger.info('Skip statistics for {} which are unchanged'.format(receiver))
+                    metrics.count('reports_skipped')
+                    continue
+                report_html = archive.load_html(receiver)
+                if report_html is not None:
+                    log.logger.info('Ready to send archived statistics for {}'.format(receiver))
+                    metrics.count('reports_resent')
+                    resend.append((receiver, email_address, report_html))
+                    continue
+        log.logger.info('Ready to send statistics for {} whose email address is {}'.format(receiver, email_address))
+        xlsx_file = '{}/statistics_{}.xlsx'.format(data_dir, receiver) if report_xlsx else None
+        jobs.append((receiver, email_address, xlsx_file))
+    receivers = [x[0] for x in jobs]
+    args = (receivers, [open_pr_dict[x] for x in receivers], [x[2] for x in jobs])
+    executor = None
+    mailer = None
+    rendered, reused = 0, 0
+    # whatever fails, the workers and the connections are closed and the digests of the sent reports are kept
+    try:
+        if workers > 1:
+            # the workers must not be forked from a process that already runs threads, they get what they need
+            # through the initializer instead
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method),
+                                           initializer=init_report_worker,
+                                           initargs=(compare_dict, sig_rows, first_column))
+            results = executor.map(render_report, *args, chunksize=max(1, len(jobs) // (workers * 4)))
         else:
-            j[0].fill = yellow_fill
-    # align center
-    for row in ws.rows:
-        row[5].alignment = alignment_center
-    # add borders
-    border = Border(left=Side(border_style='thin', color='000000'),
-                    right=Side(border_style='thin', color='000000'),
-                    top=Side(border_style='thin', color='000000'),
-                    bottom=Side(border_style='thin', color='000000'))
-    for row in ws.rows:
-        for cell in row:
-            cell.border = border
+            init_report_worker(compare_dict, sig_rows, first_column)
+            results = map(render_report, *args)
+        mailer = Mailer()
+
+        def submit(receiver, email_address, report_html):
+            on_sent = None
+            if archive:
+                on_sent = functools.partial(archive.sent, receiver, digests[receiver])
+            mailer.submit(email_builder(report_html, receiver, [email_address]), [email_address], on_sent)
+
+        for receiver, email_address, report_html in resend:
+            submit(receiver, email_address, report_html)
+        for (receiver, email_address, _), result in zip(jobs, results):
+            report_html, block_rendered, block_reused, wall, cpu = result
+            metrics.receiver(receiver, wall, cpu, len(open_pr_dict[receiver]))
+            metrics.count('rows_rendered', len(open_pr_dict[receiver]))
+            if report_unchanged == 'resend':
+                archive.save_html(receiver, report_html)
+            submit(receiver, email_address, report_html)
+            rendered += block_rendered
+            reused += block_reused
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+        if mailer:
+            mailer.close()
+        if archive:
+            archive.save(digests)
+    metrics.count('fragments_rendered', rendered)
+    metrics.count('fragments_reused', reused)
+    if archive:
+        log.logger.info('Reports: {} rendered, {} archived sent again, {} unchanged skipped'.format(
+            len(jobs), len(resend), len(digests) - len(jobs) - len(resend)))
+    if rendered + reused:
+        log.logger.info('Report fragments: {} rendered, {} reused, reuse ratio {:.1%}'.format(
+            rendered, reused, reused / (rendered + reused)))
+
+
+def report_named_styles():
+    """
+    Create the named styles shared by every cell of the report workbook
+    :return: a list of NamedStyle
+    """
+    from openpyxl.styles import Alignment, Border, NamedStyle, PatternFill, Side, Font
+    side = Side(border_style='thin', color='000000')
+    border = Border(left=side, right=side, top=side, bottom=side)
+    center = Alignment(horizontal='center', vertical='center')
+    styles = [
+        NamedStyle(name='report_sig', font=Font(name='黑体', size=20, bold=True), alignment=center, border=border),
+        NamedStyle(name='report_compare', font=Font(name='黑体', color='FF0000'), alignment=center, border=border),
+        NamedStyle(name='report_header', font=Font(bold=True), alignment=center, border=border),
+        NamedStyle(name='report_cell', border=border),
+        NamedStyle(name='report_status', fill=PatternFill('solid', start_color=status_color), border=border),
+        NamedStyle(name='report_duration', alignment=center, border=border)
+    ]
+    for _, color in duration_colors:
+        if color:
+            styles.append(NamedStyle(name='report_duration_{}'.format(color), alignment=center, border=border,
+                                     fill=PatternFill('solid', start_color=color)))
+    return styles
+
+
+def build_workbook(filepath, pr_list, compare_dict, sig_rows=True, first_column=0):
+    """
+    Write the report workbook in a single streaming pass, every row is emitted in its final order
+    :param filepath: path of the xlsx file
+    :param pr_list: ordered PullRecords
+    :param compare_dict: a dict of every sig and its compare info
+    :param sig_rows: whether to start every sig with its name and compare info, or to use a single table header
+    :param first_column: index of the first column to write, 2 skips repo and branch
+    :return: path of the xlsx file
+    """
+    # openpyxl takes longer to import than the rest of the job does, it is only loaded when a workbook is wanted
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils import get_column_letter
+    wb = openpyxl.Workbook(write_only=True)
+    for style in report_named_styles():
+        wb.add_named_style(style)
+    ws = wb.create_sheet('open_pull_requests_statistics')
+    columns = len(report_header) - first_column
+
+    def styled_cell(value, style):
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style
+        return cell
+
+    row_idx = 0
+    if not sig_rows:
+        ws.append([styled_cell(x, 'report_header') for x in report_header[first_column:]])
+        row_idx += 1
+    current_sig = None
+    for pr in pr_list:
+        if sig_rows and pr.sig != current_sig:
+            current_sig = pr.sig
+            for value, style in [(current_sig, 'report_sig'),
+                                 (single_sig_compare(current_sig, compare_dict), 'report_compare')]:
+                ws.append([styled_cell(value, style)] + [styled_cell(None, style) for _ in range(columns - 1)])
+                row_idx += 1
+                ws.merged_cells.add('A{0}:{1}{0}'.format(row_idx, get_column_letter(columns)))
+            ws.append([styled_cell(x, 'report_header') for x in report_header[first_column:]])
+            row_idx += 1
+        cells = [
+            styled_cell(pr.repo, 'report_cell'),
+            styled_cell(pr.branch, 'report_cell'),
+            styled_cell(number_link(pr), 'report_cell'),
+            styled_cell(title_link(pr), 'report_cell'),
+            styled_cell(status_text(pr.status), 'report_status' if pr.status else 'report_cell'),
+            styled_cell(pr.duration, 'report_duration_{}'.format(pr.color) if pr.color else 'report_duration')
+        ]
+        ws.append(cells[first_column:])
+        row_idx += 1
     wb.save(filepath)
-    wb.close()
-    # generate html file by the xlsx file
-    xlsx2html(filepath, html_file)
-    log.logger.info('Generate {}'.format(html_file))
+    log.logger.info('Generate {}'.format(filepath))
+    return filepath
 
 
-def send_email(xlsx_file, nickname, receivers):
+def build_email(report_html, nickname, receivers):
     """
-    Send email to reviewers
-    :param xlsx_file: path of the xlsx file
+    Build the report email to reviewers
+    :param report_html: html of the report
     :param nickname: Gitee ID of the receiver
     :param receivers: where send to
+    :return: MIMEMultipart
     """
-    username = os.getenv('SMTP_USERNAME', '')
-    port = os.getenv('SMTP_PORT', '')
-    host = os.getenv('SMTP_HOST', '')
-    password = os.getenv('SMTP_PASSWORD', '')
-    sender = os.getenv('SMTP_SENDER')
     msg = MIMEMultipart()
-    html_file = xlsx_file.replace('.xlsx', '.html')
-    with open(html_file, 'r', encoding='utf-8') as f:
-        body_of_email = f.read()
-    body_of_email = body_of_email.replace('<body>', '<body><p>Dear {},</p>'
-                                                    '<p>以下是您参与openEuler社区的SIG仓库下待处理的PR，烦请您及时跟进</p>'.
-                                          format(nickname)).replace('&nbsp;', '0')
+    body_of_email = report_html.replace('<body>', '<body><p>Dear {},</p>'
+                                                  '<p>以下是您参与openEuler社区的SIG仓库下待处理的PR，烦请您及时跟进</p>'.
+                                        format(nickname))
     content = MIMEText(body_of_email, 'html', 'utf-8')
     msg.attach(content)
     msg['Subject'] = 'openEuler 待处理PR汇总'
-    msg['From'] = sender
+    msg['From'] = os.getenv('SMTP_SENDER')
     msg['To'] = ','.join(receivers)
-    try:
-        if int(port) == 465:
-            server = smtplib.SMTP_SSL(host, port)
+    return msg
+
+
+class RateLimiter(object):
+    def __init__(self, rate):
+        """
+        Space out the calls of all threads so that there are at most rate calls per second
+        :param rate: calls per second, 0 means no limit
+        """
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.next_call = time.monotonic()
+
+    def wait(self):
+        """
+        Wait for the turn of the next call
+        """
+        if self.rate <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_call - now
+            self.next_call = max(now, self.next_call) + 1 / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+
+class Mailer(object):
+    def __init__(self):
+        """
+        Send emails from a queue over a small pool of persistent SMTP connections at a limited rate
+        """
+        self.username = os.getenv('SMTP_USERNAME', '')
+        # a broken configuration fails here rather than in the worker threads, which would leave submit() waiting
+        try:
+            self.port = int(os.getenv('SMTP_PORT', ''))
+        except ValueError:
+            raise ValueError('SMTP_PORT is not a port number: {!r}'.format(os.getenv('SMTP_PORT', '')))
+        self.host = os.getenv('SMTP_HOST', '')
+        self.password = os.getenv('SMTP_PASSWORD', '')
+        self.sender = os.getenv('SMTP_SENDER')
+        self.starttls = os.getenv('SMTP_STARTTLS', 'true').lower() in ['1', 'true', 'yes']
+        self.timeout = int(os.getenv('SMTP_TIMEOUT', '60'))
+        # messages per second of all connections, 0 means no limit
+        self.limiter = RateLimiter(float(os.getenv('SMTP_RATE', '5')))
+        self.stats = {'sent': 0, 'failed': 0, 'connections': 0}
+        self.lock = threading.Lock()
+        connections = int(os.getenv('SMTP_CONNECTIONS', '2'))
+        self.queue = queue.Queue(maxsize=connections * 10)
+        self.workers = [threading.Thread(target=self._work, daemon=True) for _ in range(connections)]
+        for worker in self.workers:
+            worker.start()
+
+    def _connect(self):
+        """
+        Open an authenticated SMTP connection
+        :return: smtplib.SMTP
+        """
+        if self.port == 465:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
             server.ehlo()
-            server.login(username, password)
         else:
-            server = smtplib.SMTP(host, port)
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
             server.ehlo()
-            server.starttls()
-            server.login(username, password)
-        server.sendmail(sender, receivers, msg.as_string())
-        log.logger.info('Sent report email to: {}'.format(receivers))
-    except smtplib.SMTPException as e:
-        log.logger.error(e)
+            if self.starttls:
+                server.starttls()
+                server.ehlo()
+        if self.username:
+            try:
+                server.login(self.username, self.password)
+            except smtplib.SMTPException:
+                server.close()
+                raise
+        with self.lock:
+            self.stats['connections'] += 1
+        return server
 
+    def _send(self, server, msg, receivers):
+        """
+        Send a message, reconnect once if the server has dropped the connection
+        :param server: current connection, None if there is none
+        :param msg: the message
+        :param receivers: where send to
+        :return: the connection to use for the next message, whether the message is sent
+        """
+        content = msg.as_string()
+        for attempt in range(2):
+            try:
+                if server is None:
+                    server = self._connect()
+                server.sendmail(self.sender, receivers, content)
+                log.logger.info('Sent report email to: {}'.format(receivers))
+                return server, True
+            except smtplib.SMTPServerDisconnected as e:
+                server = None
+                error = e
+            except smtplib.SMTPException as e:
+                log.logger.error(e)
+                return server, False
+            except OSError as e:
+                server = None
+                error = e
+        log.logger.error(error)
+        return server, False
 
-def fill_status(status, insert_string):
-    """
-    Change status of the Pull Request
-    :param status: a string of current status
-    :param insert_string: abnormal status waiting to add
-    :return: status
-    """
-    if status == '待合入':
-        status = insert_string
-    else:
-        status += '、{}'.format(insert_string)
-    return status
+    def _work(self):
+        """
+        Send queued messages over one connection until the queue is closed
+        """
+        server = None
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            msg, receivers, on_sent = item
+            try:
+                self.limiter.wait()
+                server, sent = self._send(server, msg, receivers)
+            except Exception as e:
+                # the worker keeps draining the queue whatever happens to a message
+                log.logger.error('Fail to send report email to {}: {!r}'.format(receivers, e))
+                sent = False
+            with self.lock:
+                self.stats['sent' if sent else 'failed'] += 1
+            if sent and on_sent:
+                on_sent()
+        if server is not None:
+            try:
+                server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+
+    def submit(self, msg, receivers, on_sent=None):
+        """
+        Queue a message, block while the queue is full
+        :param msg: the message
+        :param receivers: where send to
+        :param on_sent: function called once the message is sent
+        """
+        self.queue.put((msg, receivers, on_sent))
+
+    def close(self):
+        """
+        Wait until every queued message is sent and close the connections
+        """
+        for _ in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+        log.logger.info('Emails: {} sent, {} failed over {} SMTP connections'.format(
+            self.stats['sent'], self.stats['failed'], self.stats['connections']))
+        for name, value in self.stats.items():
+            metrics.count('emails_{}'.format(name) if name != 'connections' else 'smtp_connections', value)
 
 
 def clean_env(data_dir):
@@ -535,47 +1878,177 @@ def clean_env(data_dir):
     subprocess.call('rm -rf {}'.format(data_dir), shell=True)
 
 
+def count_pages(r, body, per_page):
+    """
+    Find the number of pages of a paginated API from its first response
+    :param r: response of the first page
+    :param body: decoded body of the first page
+    :param per_page: number of items per page
+    :return: number of pages, None if the response does not tell
+    """
+    if r.headers.get('total_page'):
+        return int(r.headers['total_page'])
+    total = r.headers.get('total_count')
+    if not total and isinstance(body, dict):
+        total = body.get('total')
+    if total:
+        return (int(total) + per_page - 1) // per_page
+    return None
+
+
+class FetchError(Exception):
+    pass
+
+
+def iter_pages(title, url, params, key=None, per_page=100, ttl=0):
+    """
+    Fetch every page of a paginated API with bounded parallelism, the items of every page are yielded in order as
+    soon as the page arrives
+    :param title: what is fetched, used in the logs
+    :param url: url of the API
+    :param params: query parameters except page and per_page
+    :param key: key of the items in the json body, the body itself is the list of items if None
+    :param per_page: number of items per page
+    :param ttl: seconds during which a cached page is used without asking the server
+    :return: generator of the lists of items of every page, it raises FetchError if any page fails
+    """
+    def fetch(page):
+        log.logger.info("=" * 25 + " GET {}: PAGE {} ".format(title, page) + "=" * 25)
+        query = dict(params, page=page, per_page=per_page)
+        try:
+            r = http_get(url, query, ttl)
+        except requests.RequestException as e:
+            log.logger.error(e)
+            return None, None
+        if r.status_code != 200:
+            return None, None
+        body = r.json()
+        items = body if key is None else body[key]
+        if page == 1:
+            return items, count_pages(r, body, per_page)
+        return items, None
+
+    first_page, total_page = fetch(1)
+    if first_page is None:
+        raise FetchError('Fail to get page 1 of {}'.format(title))
+    yield first_page
+    last_items = first_page
+    page = 2
+    with ThreadPoolExecutor(max_workers=http_concurrency) as executor:
+        while len(last_items) >= per_page:
+            # without a known total, probe the next batch of pages until a short page comes back
+            last_page = total_page or page + http_concurrency - 1
+            if page > last_page:
+                break
+            for offset, (items, _) in enumerate(executor.map(fetch, range(page, last_page + 1))):
+                if items is None:
+                    raise FetchError('Fail to get page {} of {}'.format(page + offset, title))
+                yield items
+                last_items = items
+                if len(items) < per_page:
+                    break
+            page = last_page + 1
+
+
+def fetch_pages(title, url, params, key=None, per_page=100, ttl=0):
+    """
+    Fetch every page of a paginated API and merge the items in order, see iter_pages
+    :return: a list of items, None if any page fails
+    """
+    try:
+        return [item for items in iter_pages(title, url, params, key, per_page, ttl) for item in items]
+    except FetchError:
+        return None
+
+
+def prefetch(iterable):
+    """
+    Consume an iterable on a thread of its own from now on, the items wait in a queue until they are asked for
+    :param iterable: the iterable
+    :return: iterator of the items, it raises the exception of the iterable if there is one
+    """
+    items = queue.Queue()
+
+    def produce():
+        try:
+            for item in iterable:
+                items.put((True, item))
+        except Exception as e:
+            items.put((False, e))
+        else:
+            items.put((False, None))
+
+    def consume():
+        while True:
+            ok, item = items.get()
+            if ok:
+                yield item
+            elif item is None:
+                return
+            else:
+                raise item
+
+    threading.Thread(target=produce, daemon=True).start()
+    return consume()
+
+
+def iter_repos_pulls():
+    """
+    Get the open pulls page by page
+    :return: generator of the pages of (pull, pull information), pull is the path of its link like owner/repo/pulls/1
+    """
+    params = {
+        'state': 'open',
+        'direction': 'asc'
+    }
+    for page in iter_pages('ENTERPRISE PULLS', '{}/pulls'.format(ipb_url), params, key='data',
+                           ttl=http_cache_ttls['pulls']):
+        yield [(x['link'].split('/', 3)[3], x) for x in page]
+
+
 def get_repos_pulls_mapping():
     """
     Get mappings between repos and pulls
     :return: a dict of {repo: pulls}
     """
-    enterprise_pulls = []
-    page = 1
-    while True:
-        log.logger.info("=" * 25 + " GET ENTERPRISE PULLS: PAGE {} ".format(page) + "=" * 25)
-        url = 'https://ipb.osinfra.cn/pulls'
-        params = {
-            'state': 'open',
-            'direction': 'asc',
-            'page': page,
-            'per_page': 100
-        }
-        r = requests.get(url, params=params)
-        if r.status_code != 200:
-            log.logger.error('Fail to get enterprise pulls list.')
-            return
-        else:
-            enterprise_pulls += r.json()['data']
-        if len(r.json()['data']) < 100:
-            break
-        page += 1
-    return {x['link'].split('/', 3)[3]: x for x in enterprise_pulls}
+    try:
+        return {mapping_key: pull for page in iter_repos_pulls() for mapping_key, pull in page}
+    except FetchError:
+        log.logger.error('Fail to get enterprise pulls list.')
+        return
 
 
-def pr_statistics(data_dir, sigs, repos_pulls_mapping, compare_dict):
+def pr_statistics(data_dir, sigs, repos_pulls_mapping, compare_dict, workers=1):
     """
     :param data_dir: directory to store temporary data
     :param sigs: a dict of every sig and its repositories
     :param repos_pulls_mapping: mappings between repos and pulls
     :param compare_dict: a dict of every sig and its compare info
+    :param workers: number of processes to render reports
+    """
+    open_pr_dict, email_mappings, _ = collect_open_prs(sigs, [list(repos_pulls_mapping.items())])
+    with metrics.stage('deliver_reports'):
+        deliver_reports(data_dir, open_pr_dict, email_mappings, compare_dict, build_email, workers)
+
+
+def collect_open_prs(sigs, pull_pages):
+    """
+    Route the open Pull Requests to their receivers page by page as the pages arrive, a record is shared by all
+    its receivers
+    :param sigs: a dict of every sig and its repositories
+    :param pull_pages: iterable of the pages of (pull, pull information), see iter_repos_pulls
+    :return: a dict of every receiver and its Pull Requests, mappings between gitee_id and email addresses and
+             the routed pulls
     """
     log.logger.info('=' * 25 + ' STATISTICS ' + '=' * 25)
     email_mappings = get_email_mappings()
-    mapping_lists = sorted(list(email_mappings.keys()))
-    open_pr_dict = {}
-    open_pr_info = []
+    mapping_lists = set(email_mappings.keys())
     extra_sig = yaml.safe_load(open('need_review.yaml', 'r').read())
+    metrics.count('yaml_files')
+    # every repository of a sig is ranked in the order of the sigs and their repositories, the records of a receiver
+    # are put in this order once every page is routed, pulls of a repository stay in the order of the pages
+    routes = {}
+    rank = 0
     for sig in sigs:
         sig_name = sig['name']
         sig_repos = sig['repositories']
@@ -584,94 +2057,217 @@ def pr_statistics(data_dir, sigs, repos_pulls_mapping, compare_dict):
             log.logger.info('Find no repositories in sig {}, skip'.format(sig_name))
             continue
         maintainers, sig_info_mark = get_maintainers(sig_name)
+        committers_mapping = get_committers_mapping(sig_name)
         for full_repo in sig_repos:
             if full_repo.split('/')[0] not in ['src-openeuler', 'openeuler']:
                 continue
-            open_pr_list = []
-            for mapping_key in repos_pulls_mapping.keys():
-                if mapping_key.startswith(full_repo + '/'):
-                    open_pr_list.append(repos_pulls_mapping[mapping_key])
-                    log.logger.info('Find open pr: {}'.format(mapping_key))
-            if not open_pr_list:
-                continue
             members = maintainers
             if sig_info_mark:
-                committers_mapping = get_committers_mapping(sig_name)
                 members = get_repo_members(maintainers, committers_mapping, full_repo, sig_name, extra_sig)
-            for item in open_pr_list:
-                title = item['title']
-                html_url = item['link']
-                number = '#' + html_url.split('/')[-1]
-                created_at = item['created_at']
-                draft = item['draft']
-                labels = item['labels'].split(',')
-                ref_branch = item['ref']
-                status = '待合入'
-                if draft:
-                    status = fill_status(status, '草稿')
-                if 'openeuler-cla/yes' not in labels:
-                    status = fill_status(status, 'CLA认证失败')
-                if 'ci_failed' in labels:
-                    status = fill_status(status, '门禁检查失败')
-                if not item['mergeable']:
-                    status = fill_status(status, '存在冲突')
-                if 'kind/wait_for_update' in labels:
-                    status = fill_status(status, '等待更新')
-                duration = count_duration(created_at)
-                link = "<a href='{0}'>{1}</a>".format(html_url, title)
-                number_link = "<a href='{0}'>{1}</a>".format(html_url, number)
-                open_pr_info.append([sig_name, full_repo, ref_branch, number_link, link, status, duration,
-                                     ','.join(members)])
-    no_addresses_id = []
-    for pr_info in open_pr_info:
-        ids = pr_info[-1]
-        for i in ids.split(','):
-            if i not in mapping_lists:
-                if i not in no_addresses_id:
-                    log.logger.warning('WARNING! gitee_id {} does not match any email address.'.format(i))
-                    no_addresses_id.append(i)
-            if i not in open_pr_dict.keys():
-                open_pr_dict[i] = [pr_info[:-1]]
-            else:
-                open_pr_dict[i].append(pr_info[:-1])
-    for receiver in sorted(list(open_pr_dict.keys())):
-        origin_pr_list = sorted(open_pr_dict[receiver], key=(lambda x: int(x[6])), reverse=True)
-        ordered_pr_list = []
-        pr_sigs = sorted(set([x[0] for x in origin_pr_list]))
-        for pr_sig in pr_sigs:
-            for op in origin_pr_list:
-                if op[0] == pr_sig:
-                    if len(ordered_pr_list) > 0 and op[0] == ordered_pr_list[-1][0] and int(op[-1]) > \
-                            int(ordered_pr_list[-1][-1]):
-                        ordered_pr_list.insert(-1, op)
-                    else:
-                        ordered_pr_list.append(op)
-        statistics_csv = '{}/statistics_{}.csv'.format(data_dir, receiver)
-        f = codecs.open(statistics_csv, 'w', encoding='utf-8')
-        writer = csv.writer(f)
-        for i in ordered_pr_list:
-            writer.writerow(i)
-        f.close()
-        email_address = email_mappings.get(receiver)
-        if not email_address:
-            log.logger.warning('Ready to send statistics for {} but cannot find the email address'.format(receiver))
-            continue
-        log.logger.info('Ready to send statistics for {} whose email address is {}'.format(receiver, email_address))
-        statistics_xlsx = csv_to_xlsx(statistics_csv)
-        excel_optimization(statistics_xlsx, compare_dict)
-        send_email(statistics_xlsx, receiver, [email_address])
+            routes.setdefault(full_repo, []).append((rank, sig_name, members))
+            rank += 1
+    buckets = {}
+    routed = {}
+    no_addresses_id = set()
+    now = datetime.datetime.today()
+    for page in pull_pages:
+        pulls = []
+        for mapping_key, item in page:
+            if mapping_key in routed:
+                continue
+            routed[mapping_key] = None
+            full_repo = '/'.join(mapping_key.split('/', 2)[:2])
+            if full_repo in routes:
+                pulls.append((mapping_key, full_repo, item))
+        classified = classify_pulls([x['created_at'] for _, _, x in pulls], [x['labels'] for _, _, x in pulls],
+                                    [x['draft'] for _, _, x in pulls], [x['mergeable'] for _, _, x in pulls], now)
+        for (mapping_key, full_repo, item), status, duration, color in zip(pulls, *classified):
+            for rank, sig_name, members in routes[full_repo]:
+                log.logger.info('Find open pr: {}'.format(mapping_key))
+                row = pull_record(sig_name, full_repo, item['ref'], item['link'], item['title'], status, duration,
+                                  color)
+                for i in members:
+                    if i not in mapping_lists and i not in no_addresses_id:
+                        log.logger.warning('WARNING! gitee_id {} does not match any email address.'.format(i))
+                        no_addresses_id.add(i)
+                    buckets.setdefault(i, []).append((rank, row))
+    open_pr_dict = {}
+    for receiver, bucket in buckets.items():
+        bucket.sort(key=lambda x: x[0])
+        open_pr_dict[receiver] = [row for _, row in bucket]
+    return open_pr_dict, email_mappings, list(routed)
+
+
+class StageGraph(object):
+    def __init__(self):
+        """
+        Stages of a run and the stages they depend on, a stage starts as soon as the stages it depends on are done
+        """
+        self.stages = {}
+        self.times = {}
+
+    def add(self, name, func, *deps):
+        """
+        :param name: name of the stage
+        :param func: function called with the results of deps in their order
+        :param deps: names of the stages it depends on
+        """
+        self.stages[name] = (func, deps)
+
+    def run(self, workers):
+        """
+        Run the stages, after a failure no stage starts any more and the exception is raised once the running
+        stages are done
+        :param workers: number of stages running at the same time
+        :return: a dict of {stage: result}
+        """
+        start = time.perf_counter()
+
+        def call(name, func, args):
+            begin = time.perf_counter() - start
+            try:
+                with metrics.stage(name):
+                    return func(*args)
+            finally:
+                self.times[name] = (begin, time.perf_counter() - start)
+
+        results = {}
+        pending = dict(self.stages)
+        running = {}
+        error = None
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                for name, (func, deps) in list(pending.items()):
+                    if error is None and all(x in results for x in deps):
+                        del pending[name]
+                        running[executor.submit(call, name, func, [results[x] for x in deps])] = name
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except BaseException as e:
+                        log.logger.error('Stage {} failed: {!r}'.format(name, e))
+                        error = error or e
+        if pending:
+            log.logger.error('Stages not run: {}'.format(', '.join(pending)))
+        if error:
+            raise error
+        if pending:
+            raise ValueError('Stages depend on unknown stages: {}'.format(', '.join(pending)))
+        self.log_critical_path(time.perf_counter() - start)
+        return results
+
+    def log_critical_path(self, wall):
+        """
+        Log the chain of stages which ends last, each one is the dependency which has finished last
+        :param wall: wall time of the run
+        """
+        name = max(self.times, key=lambda x: self.times[x][1])
+        path = [name]
+        while self.stages[name][1]:
+            name = max(self.stages[name][1], key=lambda x: self.times[x][1])
+            path.append(name)
+        log.logger.info('Critical path: {}, {:.2f}s of the {:.2f}s run'.format(
+            ' -> '.join('{} {:.2f}s'.format(x, self.times[x][1] - self.times[x][0]) for x in reversed(path)),
+            self.times[path[0]][1], wall))
+
+
+def parse_args(rate_options=True):
+    """
+    Parse options of the entry points
+    :param rate_options: whether the entry point compares processed rates of sigs
+    :return: argparse.Namespace
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=1, help='number of processes to render reports')
+    parser.add_argument('--profile', action='store_true',
+                        help='profile every stage with cProfile and tracemalloc and write the reports into data')
+    parser.add_argument('--profile-top', type=int, default=25,
+                        help='number of top functions and allocations in the profile reports')
+    if rate_options:
+        parser.add_argument('--refresh-rates', action='store_true',
+                            help='fetch processed rates from dsapi again instead of using the memoized ones')
+    return parser.parse_args()
 
 
 def main():
     """
     main function
     """
-    data_dir = prepare_env()
-    sigs, sigs_list = get_sigs()
-    compare_dict = all_sigs_compare(sigs_list)
-    print('Compare Dict: {}'.format(compare_dict))
-    repos_pulls_mapping = get_repos_pulls_mapping()
-    pr_statistics(data_dir, sigs, repos_pulls_mapping, compare_dict)
+    global refresh_rates
+    args = parse_args()
+    if args.profile:
+        metrics.enable_profiling(args.profile_top)
+    refresh_rates = args.refresh_rates
+    if refresh_rates and get_rate_memo():
+        get_rate_memo().refresh = True
+    store = get_snapshot_store()
+
+    def sigs_stage(_):
+        return get_sigs()
+
+    def pulls_stage():
+        if args.profile:
+            # the fetching is only profiled on the thread of the stage
+            return list(iter_repos_pulls())
+        # the pages keep coming on a thread of their own until collect_open_prs routes them
+        return prefetch(iter_repos_pulls())
+
+    def snapshot_stage(sigs, collected):
+        today = datetime.date.today().strftime('%Y-%m-%d')
+        store.record(today, sigs[0], collected[2])
+        anchor_stale_baselines(store, today)
+
+    def remote_rates_stage(sigs):
+        return remote_processed_rates(sigs[1], store)
+
+    def compare_stage(sigs, remote_rates=None, _=None):
+        rates = None
+        if store:
+            # the rates of a sig calculated from the snapshots and got from dsapi are the same
+            rates = local_processed_rates(store)
+            for ts, sig_rates in remote_rates.items():
+                rates.setdefault(ts, {}).update(sig_rates)
+        compare_dict = all_sigs_compare(sigs[1], store, rates)
+        print('Compare Dict: {}'.format(compare_dict))
+        return compare_dict
+
+    def collect_stage(_, sigs, pull_pages):
+        return collect_open_prs(sigs[0], pull_pages)
+
+    def deliver_stage(data_dir, collected, compare_dict):
+        open_pr_dict, email_mappings, _ = collected
+        deliver_reports(data_dir, open_pr_dict, email_mappings, compare_dict, build_email, args.workers)
+
+    # the clone of the community and the pulls listing run at the same time, the pulls are routed to the receivers
+    # while dsapi is asked for the processed rates, those calculated from the snapshots wait for the snapshot of
+    # today when it is kept
+    graph = StageGraph()
+    graph.add('prepare_env', prepare_env)
+    graph.add('get_sigs', sigs_stage, 'prepare_env')
+    graph.add('fetch_pulls', pulls_stage)
+    graph.add('collect_open_prs', collect_stage, 'prepare_env', 'get_sigs', 'fetch_pulls')
+    if store:
+        graph.add('remote_processed_rates', remote_rates_stage, 'get_sigs')
+        graph.add('record_snapshot', snapshot_stage, 'get_sigs', 'collect_open_prs')
+        graph.add('all_sigs_compare', compare_stage, 'get_sigs', 'remote_processed_rates', 'record_snapshot')
+    else:
+        graph.add('all_sigs_compare', compare_stage, 'get_sigs')
+    graph.add('deliver_reports', deliver_stage, 'prepare_env', 'collect_open_prs', 'all_sigs_compare')
+    try:
+        # profiles are only clean when a single stage runs at a time
+        graph.run(1 if args.profile else len(graph.stages))
+    finally:
+        log_http_cache_stats()
+        log_rate_memo_stats()
+        metrics.export('pr_statistics')
+        if args.profile:
+            # prepare_env makes the data directory, it is missing when the run fails before
+            os.makedirs('data', exist_ok=True)
+            metrics.dump_profiles('data')
 
 
 if __name__ == '__main__':
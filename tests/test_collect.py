@@ -0,0 +1,73 @@
+import os
+import random
+
+import pytest
+
+import pr_statistics
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def scan_rows(sigs, repos_pulls_mapping, members_of):
+    """
+    Rows of every receiver found by scanning all pulls for every repository, as before the index by repository
+    """
+    open_pr_dict = {}
+    for sig in sigs:
+        for full_repo in sig['repositories']:
+            if full_repo.split('/')[0] not in ['src-openeuler', 'openeuler']:
+                continue
+            for mapping_key in repos_pulls_mapping.keys():
+                if mapping_key.startswith(full_repo + '/'):
+                    for member in members_of(sig['name'], full_repo):
+                        open_pr_dict.setdefault(member, []).append(
+                            (sig['name'], full_repo, repos_pulls_mapping[mapping_key]['link']))
+    return open_pr_dict
+
+
+@pytest.fixture
+def community(monkeypatch):
+    rng = random.Random(2)
+    # prefixes of each other, repositories of other owners and repositories shared by sigs
+    repos = ['src-openeuler/pkg', 'src-openeuler/pkg-devel', 'src-openeuler/pkg-devel-doc', 'openeuler/kernel',
+             'openeuler/kernel-tools', 'other/pkg'] + ['src-openeuler/lib{}'.format(x) for x in range(20)]
+    sigs = [{'name': 'sig-{}'.format(x), 'repositories': rng.sample(repos, rng.randint(0, 8))} for x in range(8)]
+    sigs[0]['repositories'] += sigs[1]['repositories'][:2]
+    labels = ['openeuler-cla/yes', 'openeuler-cla/yes,ci_failed', 'openeuler-cla/no']
+    repos_pulls_mapping = {}
+    for number in range(300):
+        full_repo = rng.choice(repos + ['src-openeuler/unowned'])
+        link = 'https://gitee.com/{}/pulls/{}'.format(full_repo, number)
+        repos_pulls_mapping[link.split('/', 3)[3]] = {
+            'link': link, 'title': 'pull {}'.format(number), 'created_at': '2024-01-02 03:04:05', 'draft': False,
+            'labels': rng.choice(labels), 'ref': 'master', 'mergeable': True
+        }
+    receivers = ['user{}'.format(x) for x in range(10)]
+    maintainers = {sig['name']: rng.sample(receivers, 2) for sig in sigs}
+
+    def members_of(sig_name, full_repo):
+        return maintainers[sig_name] + [receivers[len(full_repo) % len(receivers)]]
+
+    monkeypatch.chdir(repo_dir)
+    monkeypatch.setattr(pr_statistics, 'get_email_mappings', lambda: {x: x + '@example.com' for x in receivers})
+    monkeypatch.setattr(pr_statistics, 'get_maintainers', lambda sig_name: (maintainers[sig_name], True))
+    monkeypatch.setattr(pr_statistics, 'get_committers_mapping', lambda sig_name: {})
+    monkeypatch.setattr(pr_statistics, 'get_repo_members',
+                        lambda maintainers, committers_mapping, repo, sig, extra_sig: members_of(sig, repo))
+    return sigs, repos_pulls_mapping, members_of
+
+
+def test_rows_match_scan(community):
+    sigs, repos_pulls_mapping, members_of = community
+    open_pr_dict, _, _ = pr_statistics.collect_open_prs(sigs, [list(repos_pulls_mapping.items())])
+    rows = {receiver: [(x.sig, x.repo, x.url) for x in records] for receiver, records in open_pr_dict.items()}
+    assert sum(len(x) for x in rows.values()) > 100
+    assert rows == scan_rows(sigs, repos_pulls_mapping, members_of)
+
+
+def test_rows_do_not_depend_on_pages(community):
+    sigs, repos_pulls_mapping, _ = community
+    items = list(repos_pulls_mapping.items())
+    whole, _, _ = pr_statistics.collect_open_prs(sigs, [items])
+    paged, _, _ = pr_statistics.collect_open_prs(sigs, [items[x:x + 7] for x in range(0, len(items), 7)])
+    assert paged == whole
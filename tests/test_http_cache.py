@@ -0,0 +1,108 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import pr_statistics as ps
+
+
+class EtagHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        """
+        Answer with the same body and ETag every time, 304 when the client already has it
+        """
+        self.server.requests.append(self.path)
+        if self.path.startswith('/missing'):
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps([{'path': self.path}]).encode('utf-8')
+        self.send_response(200)
+        self.send_header('ETag', '"v1"')
+        self.send_header('total_page', '1')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), EtagHandler)
+    httpd.requests = []
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def cached_http_get(monkeypatch, tmp_path):
+    """
+    Send http_get through a cache of its own and record its metrics apart from the other tests
+    """
+    monkeypatch.setattr(ps, 'http_cache_dir', str(tmp_path / 'cache'))
+    monkeypatch.setattr(ps, '_http_cache', None)
+    monkeypatch.setattr(ps, 'metrics', ps.Metrics())
+    return ps.http_get
+
+
+def test_cache_hits_are_not_counted_as_requests(server, cached_http_get):
+    url = 'http://127.0.0.1:{}/pulls/12'.format(server.server_address[1])
+    for _ in range(3):
+        assert cached_http_get(url, {'page': 1}, 600).json() == [{'path': '/pulls/12?page=1'}]
+    cached_http_get(url, {'page': 1}, 0)
+    assert len(server.requests) == 2
+    stats = ps.metrics.http['127.0.0.1:{}/pulls/{{number}}'.format(server.server_address[1])]
+    assert stats['requests'] == 2 and stats['cached'] == 2
+    assert 'pr_report_http_cached{job="test",endpoint="127.0.0.1:' in ps.metrics.prometheus('test')
+
+
+def test_cache_hit_revalidation_and_miss(server, tmp_path):
+    cache = ps.HttpCache(str(tmp_path), 1024 * 1024)
+    url = 'http://127.0.0.1:{}/pulls'.format(server.server_address[1])
+    assert cache.get(url, {'page': 1}, 600).json() == [{'path': '/pulls?page=1'}]
+    r = cache.get(url, {'page': 1}, 600)
+    assert isinstance(r, ps.CachedResponse) and not r.revalidated
+    assert r.headers['total_page'] == '1'
+    r = cache.get(url, {'page': 1}, 0)
+    assert r.revalidated and r.json() == [{'path': '/pulls?page=1'}]
+    assert cache.get(url, {'page': 2}, 600).status_code == 200
+    assert cache.stats == {'hit': 1, 'revalidated': 1, 'miss': 2, 'evicted': 0}
+    assert server.requests == ['/pulls?page=1', '/pulls?page=1', '/pulls?page=2']
+
+
+def test_failed_responses_are_not_cached(server, tmp_path):
+    cache = ps.HttpCache(str(tmp_path), 1024 * 1024)
+    url = 'http://127.0.0.1:{}/missing'.format(server.server_address[1])
+    for _ in range(2):
+        assert cache.get(url, {}, 600).status_code == 404
+    assert len(server.requests) == 2 and cache.stats['miss'] == 2
+
+
+def test_least_recently_used_responses_are_evicted(server, tmp_path):
+    cache = ps.HttpCache(str(tmp_path), 1024 * 1024)
+    url = 'http://127.0.0.1:{}/pulls'.format(server.server_address[1])
+    cache.get(url, {'page': 1}, 600)
+    size = cache.size
+    # room for two responses, the third one evicts the least recently used
+    cache = ps.HttpCache(str(tmp_path), int(size * 2.5))
+    cache.get(url, {'page': 2}, 600)
+    time.sleep(0.01)
+    cache.get(url, {'page': 1}, 600)
+    time.sleep(0.01)
+    cache.get(url, {'page': 3}, 600)
+    assert cache.stats['evicted'] == 1
+    del server.requests[:]
+    cache.get(url, {'page': 1}, 600)
+    cache.get(url, {'page': 2}, 600)
+    assert server.requests == ['/pulls?page=2']
@@ -0,0 +1,114 @@
+import time
+from email.mime.text import MIMEText
+
+import pytest
+
+import benchmark
+import pr_statistics as ps
+
+
+class DroppingHandler(benchmark.SmtpHandler):
+    def handle(self):
+        """
+        Drop the connection right after its first message, like a server closing idle or busy connections
+        """
+        self.reply('220 benchmark sink')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip().upper()
+            if command == 'DATA':
+                self.reply('354 end with .')
+                while self.rfile.readline() not in [b'.\r\n', b'']:
+                    pass
+                with self.server.lock:
+                    self.server.messages += 1
+                self.reply('250 queued')
+                return
+            self.reply('250 ok')
+
+
+@pytest.fixture
+def sink(monkeypatch):
+    """
+    Serve an SMTP sink and point the Mailer at it
+    """
+    server = benchmark.start_server(benchmark.SmtpSink())
+    monkeypatch.setenv('SMTP_HOST', '127.0.0.1')
+    monkeypatch.setenv('SMTP_PORT', str(server.server_address[1]))
+    monkeypatch.setenv('SMTP_SENDER', 'sender@example.com')
+    monkeypatch.setenv('SMTP_STARTTLS', 'false')
+    monkeypatch.setenv('SMTP_RATE', '0')
+    monkeypatch.setenv('SMTP_CONNECTIONS', '3')
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def build_email(report_html, receiver, addresses):
+    msg = MIMEText(report_html, 'html', 'utf-8')
+    msg['Subject'] = 'report of {}'.format(receiver)
+    msg['To'] = ','.join(addresses)
+    return msg
+
+
+def send(count):
+    mailer = ps.Mailer()
+    sent = []
+    for number in range(count):
+        receiver = 'user{}'.format(number)
+        mailer.submit(build_email('<p>{}</p>'.format(number), receiver, [receiver]), [receiver],
+                      lambda receiver=receiver: sent.append(receiver))
+    mailer.close()
+    return mailer, sent
+
+
+def test_messages_share_the_connections_of_the_pool(sink):
+    mailer, sent = send(30)
+    assert sink.messages == 30
+    assert sorted(sent) == sorted('user{}'.format(x) for x in range(30))
+    assert mailer.stats['sent'] == 30 and mailer.stats['failed'] == 0
+    assert 1 <= mailer.stats['connections'] <= 3
+
+
+def test_dropped_connections_are_opened_again(sink, monkeypatch):
+    sink.RequestHandlerClass = DroppingHandler
+    monkeypatch.setenv('SMTP_CONNECTIONS', '1')
+    mailer, sent = send(5)
+    assert sink.messages == 5
+    assert mailer.stats['sent'] == 5 and mailer.stats['failed'] == 0
+    assert mailer.stats['connections'] == 5
+
+
+def test_messages_are_sent_at_the_limited_rate(sink, monkeypatch):
+    monkeypatch.setenv('SMTP_RATE', '20')
+    start = time.monotonic()
+    mailer, _ = send(10)
+    # the first message goes at once, every other one waits for its turn
+    assert time.monotonic() - start >= 9 / 20 * 0.9
+    assert sink.messages == 10
+
+
+def test_a_failed_rendering_closes_the_mailer_and_keeps_the_sent_digests(sink, monkeypatch, tmp_path):
+    monkeypatch.setattr(ps, 'report_unchanged', 'skip')
+    monkeypatch.setattr(ps, 'report_archive_dir', str(tmp_path))
+    render_report = ps.render_report
+
+    def failing_render_report(receiver, pr_list, xlsx_file=None):
+        if receiver == 'bob':
+            raise RuntimeError('rendering failed')
+        return render_report(receiver, pr_list, xlsx_file)
+
+    monkeypatch.setattr(ps, 'render_report', failing_render_report)
+    closed = []
+    close = ps.Mailer.close
+    monkeypatch.setattr(ps.Mailer, 'close', lambda self: closed.append(close(self)))
+    open_pr_dict = {receiver: [ps.pull_record('sig-A', 'src-openeuler/repo', 'master',
+                                              'https://gitee.com/src-openeuler/repo/pulls/1', 'title', 0, 3, None)]
+                    for receiver in ['alice', 'bob']}
+    email_mappings = {'alice': 'alice@example.com', 'bob': 'bob@example.com'}
+    with pytest.raises(RuntimeError):
+        ps.deliver_reports(str(tmp_path), open_pr_dict, email_mappings, {'sig-A': ''}, build_email)
+    assert closed and sink.messages == 1
+    assert list(ps.ReportArchive('statistics').digests) == ['alice']
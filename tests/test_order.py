@@ -0,0 +1,45 @@
+import random
+
+from pr_statistics import order_pr_list, pull_record
+
+
+def order_pr_list_before(pr_list):
+    """
+    The ordering of the reports before the composite-key sort, kept as the oracle
+    """
+    origin_pr_list = sorted(pr_list, key=(lambda x: x.duration), reverse=True)
+    ordered_pr_list = []
+    pr_sigs = sorted(set([x.sig for x in origin_pr_list]))
+    for pr_sig in pr_sigs:
+        for op in origin_pr_list:
+            if op.sig == pr_sig:
+                if len(ordered_pr_list) > 0 and op.sig == ordered_pr_list[-1].sig and op.duration > \
+                        ordered_pr_list[-1].duration:
+                    ordered_pr_list.insert(-1, op)
+                else:
+                    ordered_pr_list.append(op)
+    return ordered_pr_list
+
+
+def random_pr_list(rng):
+    sigs = rng.sample(['sig-{}'.format(x) for x in 'ABCDEFGH'], rng.randint(1, 5))
+    # few distinct durations so that equal keys are common
+    durations = rng.sample(range(1000), rng.randint(1, 8))
+    return [pull_record(rng.choice(sigs), 'src-openeuler/repo', 'master',
+                        'https://gitee.com/src-openeuler/repo/pulls/{}'.format(number), 'title', 0,
+                        rng.choice(durations), None)
+            for number in range(rng.randint(0, 60))]
+
+
+def test_order_matches_previous_ordering():
+    for seed in range(3000):
+        pr_list = random_pr_list(random.Random(seed))
+        assert order_pr_list(pr_list) == order_pr_list_before(pr_list), 'seed {}'.format(seed)
+
+
+def test_order_is_stable_for_equal_keys():
+    rng = random.Random(0)
+    pr_list = [pull_record('sig-A', 'src-openeuler/repo', 'master',
+                           'https://gitee.com/src-openeuler/repo/pulls/{}'.format(number), 'title', 0, 5, None)
+               for number in rng.sample(range(100), 20)]
+    assert order_pr_list(pr_list) == pr_list
@@ -0,0 +1,68 @@
+import json
+import os
+
+import pytest
+
+import members_change_attention as mca
+
+fixtures_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+class RecordedResponse(object):
+    def __init__(self, status_code, headers, body):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    """
+    Serve the recorded comment pages in place of Gitee, every request is kept
+    """
+    with open(os.path.join(fixtures_dir, 'comment_pages.json'), 'r', encoding='utf-8') as f:
+        recording = json.load(f)
+    requests = []
+
+    def http_get(url, params, ttl):
+        number = url.split('/')[-2]
+        requests.append((number, params['page']))
+        pages = recording['pulls'][number]
+        if params['page'] > len(pages):
+            # Gitee answers pages past the last one with an empty list
+            return RecordedResponse(200, pages[0]['headers'], [])
+        page = pages[params['page'] - 1]
+        return RecordedResponse(200, page['headers'], page['body'])
+
+    monkeypatch.setattr(mca, 'http_get', http_get)
+    monkeypatch.setattr(mca, 'comments_per_page', recording['per_page'])
+    monkeypatch.setattr(mca, 'gitee_limiter', mca.RateLimiter(0))
+    return recording['pulls'], requests
+
+
+@pytest.mark.parametrize('number', ['1', '2', '3', '4', '5', '6'])
+def test_review_comment_matches_full_scan(recorded, number):
+    _, requests = recorded
+    expected = mca.find_review_comment(mca.get_all_comments(number))
+    requests.clear()
+    assert mca.get_review_comment(number) == expected
+
+
+def test_review_comment_on_last_page_reads_two_pages(recorded):
+    pulls, requests = recorded
+    review_comment = mca.get_review_comment('1')
+    assert mca.parse_review_checklist(review_comment) == ['alice', 'bob']
+    assert requests == [('1', 1), ('1', len(pulls['1']))]
+
+
+def test_missing_checklist(recorded):
+    assert mca.get_review_comment('3') is None
+    assert mca.get_review_comment('6') is None
+
+
+def test_failed_page(recorded, monkeypatch):
+    monkeypatch.setattr(mca, 'http_get', lambda url, params, ttl: RecordedResponse(502, {}, {'message': 'Bad Gateway'}))
+    assert mca.get_review_comment('1') is False
@@ -0,0 +1,153 @@
+import sqlite3
+import time
+
+import pytest
+
+import pr_statistics as ps
+
+sigs = [{'name': 'sig-A', 'repositories': ['src-openeuler/a']}, {'name': 'sig-B', 'repositories': ['openeuler/b']}]
+
+
+def pulls(*numbers, repo='src-openeuler/a'):
+    return ['{}/pulls/{}'.format(repo, x) for x in numbers]
+
+
+def baseline(store, sig):
+    return store.conn.execute('SELECT day, processed, open, snapshot, anchored FROM baselines WHERE sig = ?',
+                              (sig,)).fetchone()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ps.SnapshotStore(str(tmp_path / 'snapshots.db'), 2)
+
+
+def test_baseline_added_after_the_snapshot_of_its_day(store):
+    store.record('2024-01-01', sigs, pulls(1, 2) + pulls(7, repo='openeuler/b'))
+    store.add_baseline('sig-A', '2024-01-01', 10, 2)
+    assert baseline(store, 'sig-A') == ('2024-01-01', 10, 2, 2, '2024-01-01')
+    assert store.processed_rates('2024-01-01') == {'sig-A': 0.83}
+    # 1 is processed, 3 is opened
+    store.record('2024-01-02', sigs, pulls(2, 3))
+    assert store.processed_rates('2024-01-02') == {'sig-A': round(11 / 13, 2)}
+
+
+def test_baseline_added_before_the_snapshot_of_its_day(store):
+    store.add_baseline('sig-A', '2024-01-01', 10, 2)
+    assert baseline(store, 'sig-A')[3] is None
+    assert store.local_sigs('2024-01-01', pending=True) == {'sig-A'}
+    assert store.local_sigs('2024-01-01') == set()
+    assert store.processed_rates('2024-01-01') == {}
+    store.record('2024-01-01', sigs, pulls(1, 2, 3))
+    assert baseline(store, 'sig-A')[3] == 3
+    assert store.local_sigs('2024-01-01') == {'sig-A'}
+    # the open count moves by as much as the snapshot count does
+    store.record('2024-01-02', sigs, pulls(1, 2, 3, 4))
+    assert store.processed_rates('2024-01-02') == {'sig-A': round(10 / 13, 2)}
+
+
+def test_baseline_of_a_day_without_snapshot_is_dropped(store):
+    store.add_baseline('sig-A', '2024-01-01', 10, 2)
+    store.record('2024-01-02', sigs, pulls(1))
+    assert baseline(store, 'sig-A') is None
+    assert store.local_sigs('2024-01-02') == set()
+
+
+def test_eviction_moves_the_baselines_forward(store):
+    store.record('2024-01-01', sigs, pulls(1, 2))
+    store.add_baseline('sig-A', '2024-01-01', 10, 2)
+    for day, numbers in [('2024-01-02', (2, 3)), ('2024-01-03', (3,)), ('2024-01-04', (3, 4))]:
+        store.record(day, sigs, pulls(*numbers))
+    # 2024-01-02 is the oldest snapshot kept, the baseline is moved to it with the counts of that day
+    assert baseline(store, 'sig-A') == ('2024-01-02', 11, 2, 2, '2024-01-01')
+    assert store.conn.execute('SELECT MIN(day) FROM snapshots').fetchone()[0] == '2024-01-02'
+    assert store.processed_rates('2024-01-01') == {}
+    # the same counts as without eviction: 1 and 2 are processed, 3 and 4 are open
+    assert store.processed_rates('2024-01-04') == {'sig-A': round(12 / 14, 2)}
+
+
+def test_missing_days_are_skipped_when_moving_forward(store):
+    store.record('2024-01-01', sigs, pulls(1, 2))
+    store.add_baseline('sig-A', '2024-01-01', 10, 2)
+    store.record('2024-01-03', sigs, pulls(2, 3))
+    store.record('2024-01-06', sigs, pulls(3))
+    # nothing was recorded in the window of 2024-01-06 but itself
+    assert baseline(store, 'sig-A') == ('2024-01-06', 12, 1, 1, '2024-01-01')
+    assert store.processed_rates('2024-01-06') == {'sig-A': round(12 / 13, 2)}
+    assert store.processed_rates('2024-01-03') == {}
+
+
+def test_stale_baselines_are_anchored_on_dsapi(store, monkeypatch):
+    store.record('2024-01-01', sigs, pulls(1, 2))
+    store.add_baseline('sig-A', '2024-01-01', 10, 2)
+    for day in ['2024-01-02', '2024-01-03', '2024-01-04', '2024-01-05']:
+        store.record(day, sigs, pulls(1, 2))
+        assert store.stale_baselines(day) == []
+    store.record('2024-01-06', sigs, pulls(1, 2))
+    assert store.stale_baselines('2024-01-06') == [('sig-A', '2024-01-04')]
+    asked = []
+
+    def get_sig_pr_state(sig_name, ts):
+        asked.append((sig_name, ts))
+        return 15, 5, 3
+
+    monkeypatch.setattr(ps, 'get_sig_pr_state', get_sig_pr_state)
+    ps.anchor_stale_baselines(store, '2024-01-06')
+    assert asked == [('sig-A', ps.day_timestamp('2024-01-04'))]
+    assert baseline(store, 'sig-A') == ('2024-01-04', 20, 3, 2, '2024-01-04')
+    assert store.stale_baselines('2024-01-06') == []
+    assert store.processed_rates('2024-01-06') == {'sig-A': round(20 / 23, 2)}
+
+
+def test_baselines_of_an_older_store_are_migrated(tmp_path):
+    path = str(tmp_path / 'snapshots.db')
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute('CREATE TABLE baselines (sig TEXT PRIMARY KEY, day TEXT, processed INTEGER, open INTEGER)')
+        conn.execute("INSERT INTO baselines VALUES ('sig-A', '2024-01-01', 10, 2)")
+    conn.close()
+    store = ps.SnapshotStore(path, 2)
+    assert baseline(store, 'sig-A') == ('2024-01-01', 10, 2, None, '2024-01-01')
+
+
+def test_rate_memo_keeps_the_counts_of_past_timestamps(tmp_path):
+    path = str(tmp_path / 'rates.db')
+    now = int(time.time()) * 1000
+    memo = ps.RateMemo(path, 2)
+    memo.put('openeuler', 'sig-A', now - 1000, (1, 2, 3))
+    memo.put('openeuler', 'sig-A', now - 3 * 24 * 3600 * 1000, (4, 5, 6))
+    memo.put('openeuler', 'sig-A', now + 3600 * 1000, (7, 8, 9))
+    assert memo.get('openeuler', 'sig-A', now - 1000) == (1, 2, 3)
+    assert memo.get('openeuler', 'sig-B', now - 1000) is None
+    assert memo.get('openeuler', 'sig-A', now + 3600 * 1000) is None
+    memo.refresh = True
+    assert memo.get('openeuler', 'sig-A', now - 1000) is None
+    assert memo.stats['hit'] == 1 and memo.stats['miss'] == 3
+    memo.conn.close()
+    # the counts older than max_days are evicted when the memo is opened
+    memo = ps.RateMemo(path, 2)
+    assert memo.stats['evicted'] == 1
+    assert memo.get('openeuler', 'sig-A', now - 1000) == (1, 2, 3)
+
+
+def test_report_archive(monkeypatch, tmp_path):
+    monkeypatch.setattr(ps, 'report_archive_dir', str(tmp_path))
+    pr = ps.pull_record('sig-A', 'src-openeuler/a', 'master', 'https://gitee.com/src-openeuler/a/pulls/1', 'title', 0,
+                        3, None)
+    archive = ps.ReportArchive('statistics')
+    digest = archive.digest([pr], 'alice@example.com')
+    # open days only count by their colour
+    assert archive.digest([pr._replace(duration=5)], 'alice@example.com') == digest
+    assert archive.digest([pr._replace(duration=10, color='FFDAB9')], 'alice@example.com') != digest
+    assert archive.digest([pr], 'bob@example.com') != digest
+    assert not archive.unchanged('alice', digest)
+    archive.sent('alice', digest)
+    archive.sent('bob', digest)
+    archive.save_html('alice', '<p>alice</p>')
+    archive.save_html('bob', '<p>bob</p>')
+    archive.save(['alice'])
+    archive = ps.ReportArchive('statistics')
+    assert archive.unchanged('alice', digest)
+    assert archive.load_html('alice') == '<p>alice</p>'
+    assert archive.digests == {'alice': digest}
+    assert archive.load_html('bob') is None
@@ -0,0 +1,12 @@
+import openpyxl
+
+from pr_statistics import build_workbook, pull_record, render_pr_row
+
+
+def test_workbook_title_is_not_escaped(tmp_path):
+    pr = pull_record('sig-A', 'src-openeuler/repo', 'master', 'https://gitee.com/src-openeuler/repo/pulls/1',
+                     'fix a < b && c > "d"', 0, 3, None)
+    filepath = build_workbook(str(tmp_path / 'report.xlsx'), [pr], {'sig-A': ''}, sig_rows=False)
+    rows = list(openpyxl.load_workbook(filepath).active.iter_rows(values_only=True))
+    assert rows[1][3] == "<a href='{}'>{}</a>".format(pr.url, pr.title)
+    assert 'fix a &lt; b &amp;&amp; c &gt; &quot;d&quot;' in render_pr_row(pr)